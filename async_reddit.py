@@ -0,0 +1,234 @@
+import asyncio
+import contextlib
+import functools
+import importlib.util
+import json
+from types import SimpleNamespace
+
+from metrics import count_retry
+from rate_limit import retry_after
+
+
+def asyncpraw_available():
+    """asyncpraw is optional: without it every fetch goes through sync PRAW"""
+    return importlib.util.find_spec('asyncpraw') is not None
+
+
+def snapshot_submission(submission):
+    """Copy the fields the generator uses into a plain object that needs no client"""
+    return SimpleNamespace(
+        id=submission.id,
+        title=submission.title,
+        selftext=submission.selftext,
+        permalink=submission.permalink,
+        over_18=submission.over_18,
+        score=submission.score,
+        author=str(submission.author) if submission.author else None,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def async_rate_limited_requestor():
+    """Build the requestor class on first use, so importing this module does not load asyncpraw"""
+    from asyncprawcore import Requestor
+
+    class AsyncRateLimitedRequestor(Requestor):
+        """asyncprawcore requestor that waits on a RateLimiter before every request and retries 429s"""
+
+        def __init__(self, *args, rate_limiter=None, max_retries=3, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.rate_limiter = rate_limiter
+            self.max_retries = max_retries
+
+        @contextlib.asynccontextmanager
+        async def request(self, *args, **kwargs):
+            # asyncprawcore enters the request as `async with`, so this has to be a context manager too
+            attempt = 0
+            while True:
+                await self.rate_limiter.acquire_async()
+                async with super().request(*args, **kwargs) as response:
+                    self.rate_limiter.record(response.headers)
+                    if response.status != 429 or attempt >= self.max_retries:
+                        yield response
+                        return
+                attempt += 1
+                delay = retry_after(response.headers)
+                print(f"Reddit rate limit hit, retrying in {delay:.0f}s ({attempt}/{self.max_retries})")
+                count_retry()
+                self.rate_limiter.penalize(delay)
+
+    return AsyncRateLimitedRequestor
+
+
+class CachedResponse:
+    """Stands in for an aiohttp response served from a ResponseCache entry"""
+
+    def __init__(self, entry):
+        from multidict import CIMultiDict
+
+        self.status = entry['status']
+        self.headers = CIMultiDict(entry['headers'])
+        self.url = entry['url']
+        self.body = entry['body']
+
+    async def text(self, *args, **kwargs):
+        return self.body
+
+    async def read(self):
+        return self.body.encode('utf-8')
+
+    async def json(self, *args, **kwargs):
+        return json.loads(self.body)
+
+
+@functools.lru_cache(maxsize=None)
+def async_caching_requestor():
+    """Build the caching requestor class on first use (see async_rate_limited_requestor)"""
+
+    class AsyncCachingRequestor(async_rate_limited_requestor()):
+        """
+        Rate-limited asyncprawcore requestor that serves and stores GETs
+        through a ResponseCache in 'cache' mode, like CachingRequestor does
+        for the sync client. Fresh entries never touch the rate limit.
+        """
+
+        def __init__(self, *args, response_cache=None, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.response_cache = response_cache
+
+        @contextlib.asynccontextmanager
+        async def request(self, method, url, *args, **kwargs):
+            cache = self.response_cache
+            if cache is None or cache.mode != 'cache' or method.upper() != 'GET':
+                async with super().request(method, url, *args, **kwargs) as response:
+                    yield response
+                return
+
+            key = cache.key(method, url, kwargs.get('params'))
+            entry = cache.load(key)
+            if entry and cache.is_fresh(entry):
+                yield CachedResponse(entry)
+                return
+
+            if entry:
+                conditional = cache.validators(entry)
+                if conditional:
+                    kwargs['headers'] = {**(kwargs.get('headers') or {}), **conditional}
+
+            async with super().request(method, url, *args, **kwargs) as response:
+                if entry and response.status == 304:
+                    cache.touch(key, entry)
+                    response = CachedResponse(entry)
+                elif response.status == 200:
+                    # aiohttp keeps the body it read, so the caller can still parse it
+                    cache.save_parts(key, str(response.url), response.status, response.headers,
+                                     await response.text())
+                yield response
+
+    return AsyncCachingRequestor
+
+
+class AsyncRedditFetcher:
+    """
+    Fetch Reddit listings and comment trees concurrently.
+
+    Every call opens one asyncpraw client, so all of its requests share a
+    single pooled HTTP session, and runs them at the same time (up to
+    `max_concurrency` in flight). Fetching five listings, or the comments of
+    five posts, then costs about one round-trip instead of five.
+    """
+
+    def __init__(self, client_id, client_secret, user_agent, max_concurrency=8, rate_limiter=None,
+                 response_cache=None):
+        """
+        Args:
+            client_id (str): Reddit app client id
+            client_secret (str): Reddit app client secret
+            user_agent (str): User agent sent with every request
+            max_concurrency (int): Maximum requests in flight at once
+            rate_limiter (RateLimiter): Shared request budget to draw from (optional)
+            response_cache (ResponseCache): Serve fresh GETs from disk in 'cache' mode (needs rate_limiter)
+        """
+        if not asyncpraw_available():
+            raise ImportError("asyncpraw is not installed")
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.user_agent = user_agent
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        self.response_cache = response_cache
+
+    def _client(self):
+        import asyncpraw
+
+        requestor = {}
+        if self.rate_limiter and self.response_cache:
+            requestor = {
+                'requestor_class': async_caching_requestor(),
+                'requestor_kwargs': {'rate_limiter': self.rate_limiter, 'response_cache': self.response_cache},
+            }
+        elif self.rate_limiter:
+            requestor = {
+                'requestor_class': async_rate_limited_requestor(),
+                'requestor_kwargs': {'rate_limiter': self.rate_limiter},
+            }
+        return asyncpraw.Reddit(
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            user_agent=self.user_agent,
+            **requestor
+        )
+
+    async def _listing(self, reddit, semaphore, subreddit_name, limit):
+        async with semaphore:
+            subreddit = await reddit.subreddit(subreddit_name)
+            return [snapshot_submission(s) async for s in subreddit.hot(limit=limit)]
+
+    async def _listings(self, subreddits, limit):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._client() as reddit:
+            results = await asyncio.gather(
+                *(self._listing(reddit, semaphore, name, limit) for name in subreddits),
+                return_exceptions=True
+            )
+        return dict(zip(subreddits, results))
+
+    def fetch_listings(self, subreddits, limit):
+        """
+        Fetch the hot listing of every subreddit at once.
+
+        Returns:
+            dict: subreddit -> list of submission snapshots, or the exception that fetch raised
+        """
+        return asyncio.run(self._listings(subreddits, limit))
+
+    async def _post(self, reddit, semaphore, post_id, selector):
+        async with semaphore:
+            submission = await reddit.submission(post_id, fetch=False)
+            # Must be set before the submission is loaded
+            submission.comment_sort = selector.comment_sort
+            await submission.load()
+            comments = await selector.select_async(submission)
+            return snapshot_submission(submission), comments
+
+    async def _posts(self, post_ids, selector):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._client() as reddit:
+            results = await asyncio.gather(
+                *(self._post(reddit, semaphore, post_id, selector) for post_id in post_ids),
+                return_exceptions=True
+            )
+        return dict(zip(post_ids, results))
+
+    def fetch_posts(self, post_ids, selector):
+        """
+        Load several posts and select their comments at once.
+
+        Args:
+            post_ids (list): Submission ids
+            selector (CommentSelector): Picks the comments of each post
+
+        Returns:
+            dict: post id -> (submission snapshot, comment dicts), or the exception that fetch raised
+        """
+        return asyncio.run(self._posts(post_ids, selector))
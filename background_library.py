@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+
+from ffmpeg_render import ffmpeg_binary, probe_media
+from metrics import run_process
+
+
+class BackgroundLibrary:
+    """
+    Transcode background videos once into a canonical format and serve the copies.
+
+    Every source in `source_dir` is converted to the target frame rate and
+    size, without audio and with a keyframe every `keyframe_interval`
+    seconds so seeking is cheap. By default each source keeps its aspect
+    ratio and is only scaled down to `max_height`, so a 4K source is not
+    decoded at 4K on every render. The result is stored in `cache_dir` under
+    the source's content hash and the profile, so a source is only ever
+    transcoded once per profile.
+
+    Next to each prepared copy sits a seek index (<copy>.index.json) with its
+    duration and keyframe timestamps, used to start renders at a random
+    keyframe without decoding the lead-in.
+    """
+
+    EXTENSIONS = ('.mp4', '.mkv', '.mov', '.webm')
+
+    def __init__(self, source_dir, cache_dir, width=None, height=None, fps=24, keyframe_interval=1, max_height=1080):
+        """
+        Args:
+            source_dir (str): Directory with the original background videos
+            cache_dir (str): Directory for the prepared copies
+            width (int): Target width in pixels; with `height`, sources are scaled and cropped to fill
+                         exactly that size (None: keep each source's aspect ratio)
+            height (int): Target height in pixels (None: see `max_height`)
+            fps (int): Target frame rate
+            keyframe_interval (int): Seconds between keyframes
+            max_height (int): With neither width nor height set, scale taller sources down to this height
+        """
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.keyframe_interval = keyframe_interval
+        self.max_height = max_height
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def profile_id(self):
+        if not self.width and not self.height:
+            return f"max{self.max_height}_{self.fps}fps_k{self.keyframe_interval}"
+        return f"{self.width or 'src'}x{self.height or 'src'}_{self.fps}fps_k{self.keyframe_interval}"
+
+    def scale_filter(self):
+        """ffmpeg filter that brings a source to the target size (x264 needs even dimensions)"""
+        if self.width and self.height:
+            return (
+                f"scale={self.width}:{self.height}:force_original_aspect_ratio=increase,"
+                f"crop={self.width}:{self.height}"
+            )
+        if self.height:
+            return f"scale=-2:{self.height}"
+        if self.width:
+            return f"scale={self.width}:-2"
+        return f"scale=-2:trunc(min(ih\\,{self.max_height})/2)*2"
+
+    def sources(self):
+        """List the original background videos"""
+        return sorted(
+            os.path.join(self.source_dir, f) for f in os.listdir(self.source_dir)
+            if f.lower().endswith(self.EXTENSIONS)
+        )
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        tmp_path = f"{self.manifest_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def source_hash(self, source_path):
+        """Content hash of a source, recomputed only when its size or mtime changes"""
+        stat = os.stat(source_path)
+        with self.lock:
+            manifest = self._load_manifest()
+            entry = manifest.get(os.path.abspath(source_path))
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                return entry['sha256']
+
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+
+        with self.lock:
+            manifest = self._load_manifest()
+            manifest[os.path.abspath(source_path)] = {
+                'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest.hexdigest()
+            }
+            self._save_manifest(manifest)
+        return digest.hexdigest()
+
+    def prepared_path(self, source_path):
+        return os.path.join(self.cache_dir, f"{self.source_hash(source_path)[:16]}_{self.profile_id}.mp4")
+
+    def prepare(self, source_path):
+        """
+        Transcode a source into the canonical format if it is not prepared yet.
+
+        Returns:
+            str: Path to the prepared copy
+
+        Raises:
+            RuntimeError: If ffmpeg is missing or fails
+        """
+        target = self.prepared_path(source_path)
+        if os.path.exists(target):
+            return target
+
+        binary = ffmpeg_binary()
+        if not binary:
+            raise RuntimeError("ffmpeg not found")
+
+        print(f"Preparing background {os.path.basename(source_path)} ({self.profile_id})...")
+        tmp_path = f"{target}.tmp{os.getpid()}.mp4"
+        gop = str(self.fps * self.keyframe_interval)
+        command = [
+            binary, "-hide_banner", "-loglevel", "error", "-y",
+            "-i", source_path,
+            "-vf", f"{self.scale_filter()},fps={self.fps},format=yuv420p",
+            "-an",
+            "-c:v", "libx264", "-preset", "fast", "-crf", "20",
+            "-g", gop, "-keyint_min", gop, "-sc_threshold", "0",
+            "-movflags", "+faststart",
+            tmp_path
+        ]
+        result = run_process(command)
+        if result.returncode != 0:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
+        os.replace(tmp_path, target)
+        self.index(target)
+        print(f"✅ Background prepared: {os.path.basename(target)}")
+        return target
+
+    def index(self, video_path):
+        """
+        Load, or build and store, the seek index of a video.
+
+        Returns:
+            dict: duration (s) and keyframes (list of timestamps in seconds)
+        """
+        index_path = f"{video_path}.index.json"
+        try:
+            with open(index_path, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+
+        # Decode keyframes only and read their timestamps from showinfo
+        result = run_process(
+            [ffmpeg_binary(), "-hide_banner", "-skip_frame", "nokey", "-i", video_path,
+             "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"]
+        )
+        keyframes = [float(t) for t in re.findall(r"pts_time:\s*([\d.]+)", result.stderr)]
+        index = {
+            'duration': probe_media(video_path)['duration'],
+            'keyframes': keyframes or [0.0]
+        }
+
+        tmp_path = f"{index_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+        return index
+
+    def pick_offset(self, video_path, duration):
+        """
+        Pick a random keyframe to start from that leaves at least `duration` seconds.
+
+        Returns:
+            float: Start offset in seconds (0 when the video is shorter than `duration`)
+        """
+        try:
+            index = self.index(video_path)
+        except Exception as e:
+            print(f"Error indexing background {os.path.basename(video_path)}: {e}")
+            return 0.0
+        candidates = [t for t in index['keyframes'] if t + duration <= index['duration']]
+        return random.choice(candidates) if candidates else 0.0
+
+    def prepare_all(self):
+        """Prepare every source; returns the prepared paths"""
+        prepared = []
+        for source_path in self.sources():
+            try:
+                prepared.append(self.prepare(source_path))
+            except Exception as e:
+                print(f"Error preparing background {os.path.basename(source_path)}: {e}")
+        return prepared
+
+    def choose(self):
+        """
+        Pick a random background and return its prepared copy.
+
+        Returns:
+            str: Path to a prepared background, or None if there are no sources
+        """
+        sources = self.sources()
+        if not sources:
+            return None
+        return self.prepare(random.choice(sources))
@@ -0,0 +1,445 @@
+"""
+Offline end-to-end benchmark of the video pipeline.
+
+Runs the real RedditVideoGenerator (candidate queue, comment selection,
+narration, screenshots, ffmpeg render, upload spool) against local
+stand-ins, so the numbers need no credentials or network:
+
+  * Reddit: a fake praw client serving generated posts and comments
+  * Screenshots: the posts as HTML pages on a localhost server
+    (--renderer cards draws them instead, no browser needed)
+  * TTS: silent WAVs as long as the text would take to read
+  * YouTube: an in-memory videos().insert that accepts the chunks
+
+Everything runs in a scratch directory. Per-stage numbers come from the
+generator's own spans (metrics/spans.jsonl).
+
+    python bench_pipeline.py [--posts 5] [--comments 5] [--renderer cards] [--output bench.json]
+"""
+import argparse
+import contextlib
+import http.server
+import importlib.util
+import json
+import os
+import random
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from html import escape
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+SUBREDDIT = 'benchmark'
+WORDS = (
+    "the my and then we she he it was to so because after that night when they told me about "
+    "our neighbor house car work friend dog never again honestly still weird story time"
+).split()
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+# --- Reddit ---------------------------------------------------------------
+
+class FakeComment:
+    def __init__(self, post_id, index, body, score):
+        self.id = f"{post_id}c{index}"
+        self.body = body
+        self.score = score
+        self.author = f"commenter{index}"
+        self.parent_id = f"t3_{post_id}"
+
+
+class MoreComments:
+    """Stands in for praw's "load more" stub (matched by class name)"""
+
+    def __init__(self, children):
+        self.children = children
+
+    def comments(self):
+        return self.children
+
+
+class FakeSubmission:
+    def __init__(self, index, rng, comment_count, post_words, comment_words, page_size):
+        self.id = f"bench{index:04d}"
+        self.title = f"Benchmark story number {index}: {words(rng, 8)}"
+        self.selftext = words(rng, post_words)
+        self.permalink = f"/r/{SUBREDDIT}/comments/{self.id}/benchmark_story_{index}/"
+        self.author = f"poster{index}"
+        self.score = 1000 - index
+        self.over_18 = False
+        self.comment_sort = None
+        # Best first, like comment_sort='top'; the tail sits behind a "load more" stub
+        self.comment_list = [
+            FakeComment(self.id, i, words(rng, comment_words), 500 - i) for i in range(comment_count)
+        ]
+        self.comments = list(self.comment_list[:page_size])
+        if comment_count > page_size:
+            self.comments.append(MoreComments(self.comment_list[page_size:]))
+
+
+class FakeSubreddit:
+    def __init__(self, submissions):
+        self.submissions = submissions
+
+    def hot(self, limit=None):
+        return iter(self.submissions[:limit])
+
+
+class FakeReddit:
+    """The slice of praw.Reddit the generator uses"""
+
+    def __init__(self, submissions):
+        self.submissions = {submission.id: submission for submission in submissions}
+        self.listing = list(submissions)
+
+    def subreddit(self, name):
+        return FakeSubreddit(self.listing)
+
+    def submission(self, id):
+        return self.submissions[id]
+
+
+def attach_fake_reddit(generator, reddit, state_dir):
+    """Give the generator the clients connect_reddit would create, backed by `reddit`"""
+    from candidate_queue import CandidateQueue
+    from rate_limit import RateLimiter
+    generator.reddit = reddit
+    # Effectively unlimited, but still the real locking and bookkeeping
+    generator.rate_limiter = RateLimiter(os.path.join(state_dir, 'rate_limit.json'), rate=1e6, burst=1e6)
+    generator.response_cache = None
+    generator.async_fetcher = None
+    generator.candidates = CandidateQueue(
+        reddit, [SUBREDDIT], generator.candidates_file,
+        is_taken=lambda post_id: post_id in generator.processed_posts or post_id in generator.reserved_posts,
+        per_subreddit=len(reddit.listing)
+    )
+
+
+# --- Browser pages --------------------------------------------------------
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ background: #dae0e6; font-family: sans-serif; margin: 0; padding: 20px; }}
+div {{ background: #fff; border-radius: 4px; margin: 0 auto 12px; max-width: 740px; padding: 16px; }}
+h1 {{ font-size: 20px; margin: 0 0 8px; }}
+small {{ color: #787c7e; }}
+</style></head>
+<body>
+<div data-testid="post-content"><small>r/{subreddit} · u/{author}</small><h1>{title}</h1><p>{text}</p></div>
+{comments}
+</body></html>
+"""
+
+COMMENT_TEMPLATE = (
+    '<div data-testid="comment" id="t1_{id}" data-comment-id="{id}">'
+    '<small>u/{author} · {score} points</small><p>{body}</p></div>'
+)
+
+
+def render_page(submission):
+    comments = '\n'.join(
+        COMMENT_TEMPLATE.format(id=c.id, author=escape(c.author), score=c.score, body=escape(c.body))
+        for c in submission.comment_list
+    )
+    return PAGE_TEMPLATE.format(
+        title=escape(submission.title), subreddit=SUBREDDIT, author=escape(submission.author),
+        text=escape(submission.selftext), comments=comments
+    )
+
+
+@contextlib.contextmanager
+def page_server(reddit):
+    """Serve every post's permalink as a static page; yields the base URL"""
+    pages = {submission.permalink: render_page(submission).encode('utf-8') for submission in reddit.listing}
+
+    class PageHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = pages.get(self.path)
+            self.send_response(200 if body else 404)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body or b'')))
+            self.end_headers()
+            self.wfile.write(body or b'')
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    threading.Thread(target=server.serve_forever, name="bench-pages", daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# --- TTS ------------------------------------------------------------------
+
+class StubNarration:
+    """
+    Drop-in for NarrationService that writes silent WAVs instead of speech.
+
+    Each clip lasts as long as reading the text at `words_per_minute`
+    would, so the render stage sees realistic durations.
+    """
+
+    def __init__(self, words_per_minute=165, sample_rate=22050):
+        self.words_per_minute = words_per_minute
+        self.sample_rate = sample_rate
+
+    def start(self):
+        pass
+
+    def synthesize(self, text, filepath):
+        return self.synthesize_many({filepath: (text, filepath)})[filepath]
+
+    def synthesize_many(self, clips):
+        results = {}
+        for key, (text, filepath) in clips.items():
+            seconds = max(1.0, len(text.split()) * 60 / self.words_per_minute)
+            frames = int(seconds * self.sample_rate)
+            with wave.open(filepath, 'wb') as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(self.sample_rate)
+                f.writeframes(struct.pack('<h', 0) * frames)
+            results[key] = filepath
+        return results
+
+    def close(self):
+        pass
+
+
+# --- YouTube --------------------------------------------------------------
+
+class FakeUploadStatus:
+    def __init__(self, sent, total):
+        self.resumable_progress = sent
+        self.total_size = total
+
+    def progress(self):
+        return self.resumable_progress / self.total_size if self.total_size else 1.0
+
+
+class FakeInsertRequest:
+    """Accepts a resumable upload chunk by chunk, like googleapiclient's HttpRequest"""
+
+    def __init__(self, service, body, media_body):
+        self.service = service
+        self.body = body
+        self.media = media_body
+        self.resumable_uri = None
+        self.resumable_progress = 0
+        self._in_error_state = False
+
+    def next_chunk(self):
+        total = self.media.size()
+        if self.resumable_uri is None:
+            self.resumable_uri = f"http://127.0.0.1/upload/{id(self)}"
+        self._in_error_state = False
+        chunk = self.media.getbytes(self.resumable_progress, self.media.chunksize())
+        if self.service.bytes_per_second:
+            time.sleep(len(chunk) / self.service.bytes_per_second)
+        self.resumable_progress += len(chunk)
+        if self.resumable_progress < total:
+            return FakeUploadStatus(self.resumable_progress, total), None
+        return None, self.service.finish(self.body, total)
+
+
+class FakeExecute:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeYouTube:
+    """videos().insert and thumbnails().set, kept in memory"""
+
+    def __init__(self, upload_mbps=0):
+        self.bytes_per_second = upload_mbps * 1024 * 1024 / 8
+        self.uploads = []
+        self.lock = threading.Lock()
+
+    def videos(self):
+        return self
+
+    def thumbnails(self):
+        return self
+
+    def insert(self, part, body, media_body):
+        return FakeInsertRequest(self, body, media_body)
+
+    def set(self, videoId, media_body):
+        return FakeExecute({'videoId': videoId})
+
+    def finish(self, body, size):
+        with self.lock:
+            self.uploads.append({'title': body['snippet']['title'], 'bytes': size})
+            return {'id': f"fake{len(self.uploads):04d}"}
+
+
+# --- Harness --------------------------------------------------------------
+
+def make_background(path, seconds):
+    """A synthetic, reproducible background clip"""
+    from ffmpeg_render import ffmpeg_binary
+    subprocess.run([
+        ffmpeg_binary(), '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', f'testsrc2=size=1920x1080:rate=24:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', path
+    ], check=True)
+
+
+def summarize(spans_path):
+    """Per-stage totals from the generator's span log"""
+    stages = {}
+    with open(spans_path, 'r') as f:
+        for line in f:
+            span = json.loads(line)
+            stages.setdefault(span['stage'], []).append(span)
+
+    summary = {}
+    for stage, spans in stages.items():
+        walls = [span['wall_seconds'] for span in spans]
+        summary[stage] = {
+            'runs': len(spans),
+            'failed': sum(1 for span in spans if not span['ok']),
+            'wall_seconds_total': sum(walls),
+            'wall_seconds_median': statistics.median(walls),
+            'wall_seconds_max': max(walls),
+            'cpu_seconds_total': sum(span['cpu_seconds'] + span['child_cpu_seconds'] for span in spans),
+            'bytes_written': sum(span['bytes_written'] for span in spans),
+            'runs_per_second': len(spans) / sum(walls) if sum(walls) else None,
+        }
+    return summary
+
+
+def run(args, workdir):
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    submissions = [
+        FakeSubmission(i, rng, args.comments, args.post_words, args.comment_words, args.comment_page)
+        for i in range(args.posts)
+    ]
+    reddit = FakeReddit(submissions)
+
+    os.chdir(workdir)
+    os.makedirs('background_videos', exist_ok=True)
+    if args.background_seconds > 0:
+        make_background(os.path.join('background_videos', 'bench.mp4'), args.background_seconds)
+
+    from main import RedditVideoGenerator
+    generator = RedditVideoGenerator(
+        tts_workers=0, tts_cache_mb=0, browsers=args.browsers, renderer=args.renderer,
+        render_engine=args.render_engine, render_workers=args.render_workers, upload_workers=args.upload_workers
+    )
+    timings = {}
+    try:
+        attach_fake_reddit(generator, reddit, workdir)
+        generator.narration = StubNarration()
+        youtube = FakeYouTube(args.upload_mbps)
+        generator.authenticate_youtube = generator.get_youtube = lambda: youtube
+
+        # One-off costs the benchmark should not count against the first video
+        start = time.perf_counter()
+        generator.background_library.prepare_all()
+        timings['prepare_backgrounds'] = time.perf_counter() - start
+
+        with contextlib.ExitStack() as stack:
+            if args.renderer == 'browser':
+                generator.reddit_base_url = stack.enter_context(page_server(reddit))
+
+            start = time.perf_counter()
+            results = generator.run_batch(args.posts, subreddit=SUBREDDIT, auto_upload=args.upload)
+            timings['generate'] = time.perf_counter() - start
+            start = time.perf_counter()
+            generator.wait_for_uploads()
+            timings['upload_drain'] = time.perf_counter() - start
+    finally:
+        generator.close()
+
+    end_to_end = timings['generate'] + timings['upload_drain']
+    return {
+        'config': vars(args),
+        'videos': len(results),
+        'uploads': len(youtube.uploads),
+        'timings': timings,
+        'end_to_end_seconds': end_to_end,
+        'videos_per_minute': len(results) * 60 / end_to_end if end_to_end else None,
+        'stages': summarize(os.path.join(generator.metrics_dir, 'spans.jsonl')),
+    }
+
+
+def report(results):
+    print(f"\n{results['videos']} video(s), {results['uploads']} upload(s) "
+          f"in {results['end_to_end_seconds']:.2f}s end to end "
+          f"({results['videos_per_minute'] or 0:.1f} videos/min)")
+    print(f"  background preparation (not counted): {results['timings']['prepare_backgrounds']:.2f}s")
+    print(f"  waiting for uploads after the batch:  {results['timings']['upload_drain']:.2f}s\n")
+
+    print(f"  {'stage':<20} {'runs':>5} {'fail':>5} {'total s':>9} {'median ms':>10} {'max ms':>9} {'runs/s':>8} {'MB out':>8}")
+    for stage, s in sorted(results['stages'].items(), key=lambda item: -item[1]['wall_seconds_total']):
+        print(f"  {stage:<20} {s['runs']:>5} {s['failed']:>5} {s['wall_seconds_total']:>9.2f} "
+              f"{s['wall_seconds_median'] * 1000:>10.1f} {s['wall_seconds_max'] * 1000:>9.1f} "
+              f"{s['runs_per_second'] or 0:>8.2f} {s['bytes_written'] / 1024 / 1024:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=5, help='Videos to make')
+    parser.add_argument('--comments', type=int, default=5, help='Comments per post')
+    parser.add_argument('--comment-page', type=int, default=20, help='Comments before the "load more" stub')
+    parser.add_argument('--post-words', type=int, default=60, help='Words in each post body')
+    parser.add_argument('--comment-words', type=int, default=20, help='Words in each comment')
+    parser.add_argument('--renderer', choices=['browser', 'cards'], default='browser', help='Screenshot the local pages or draw the cards')
+    parser.add_argument('--render-engine', choices=['ffmpeg', 'segmented', 'moviepy'], default='ffmpeg')
+    parser.add_argument('--render-workers', type=int, default=1, help='Cards rendered at once by the segmented engine')
+    parser.add_argument('--browsers', type=int, default=1, help='Headless browsers kept warm')
+    parser.add_argument('--background-seconds', type=int, default=60, help='Length of the synthetic background (0 = none)')
+    parser.add_argument('--no-upload', dest='upload', action='store_false', help='Skip the YouTube stage')
+    parser.add_argument('--upload-workers', type=int, default=2)
+    parser.add_argument('--upload-mbps', type=float, default=0, help='Simulated upload bandwidth (0 = unlimited)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the generated posts and background offsets')
+    parser.add_argument('--workdir', default=None, help='Scratch directory to run in and keep (default: a temporary one)')
+    parser.add_argument('--output', default=None, help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.renderer == 'browser' and importlib.util.find_spec('selenium') is None:
+        print("selenium is not installed; drawing the cards instead of screenshotting pages")
+        args.renderer = 'cards'
+    if args.upload and importlib.util.find_spec('googleapiclient') is None:
+        print("google-api-python-client is not installed; skipping the upload stage")
+        args.upload = False
+
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='reddit_video_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        results = run(args, workdir)
+    finally:
+        os.chdir(HERE)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report(results)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Cold-start benchmark for main.py.
+
+Times fresh interpreter launches of the CLI (median of several runs) and
+compares them with the import cost main.py used to pay up front, when
+praw, selenium, moviepy and the Google API client were all imported at
+module level.
+
+    python bench_startup.py [--runs 10]
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(HERE, 'main.py')
+
+# What main.py imported at the top before the stages loaded their own dependencies
+EAGER_MODULES = [
+    'praw', 'selenium.webdriver', 'moviepy.editor', 'googleapiclient.discovery',
+    'googleapiclient.http', 'google_auth_oauthlib.flow', 'google.auth.transport.requests',
+    'asyncpraw', 'pyttsx3',
+]
+
+HEAVY_MODULES = ['praw', 'prawcore', 'asyncpraw', 'selenium', 'moviepy', 'googleapiclient', 'pyttsx3', 'numpy', 'PIL']
+
+
+def installed(module):
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def time_command(args, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def loaded_heavy_modules():
+    """Heavy modules present in sys.modules after `import main`"""
+    script = (
+        "import sys, main; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, '-c', script], cwd=HERE, capture_output=True, text=True, check=True)
+    return output.stdout.strip() or 'none'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Launches per measurement')
+    args = parser.parse_args()
+
+    eager = [module for module in EAGER_MODULES if installed(module)]
+    missing = [module for module in EAGER_MODULES if module not in eager]
+
+    cases = [
+        ('python (empty interpreter)', [sys.executable, '-c', 'pass']),
+        ('import main (lazy)', [sys.executable, '-c', 'import main']),
+        ('import main + old eager imports', [sys.executable, '-c', f"import {', '.join(eager)}; import main"]),
+    ]
+    cases += [
+        (f"main.py {command} --help", [sys.executable, MAIN, command, '--help'])
+        for command in ('fetch', 'narrate', 'render', 'upload')
+    ]
+
+    print(f"Median of {args.runs} cold starts each\n")
+    results = {}
+    for label, command in cases:
+        results[label] = time_command(command, args.runs)
+        print(f"  {label:<36} {results[label] * 1000:8.1f} ms")
+
+    saved = results['import main + old eager imports'] - results['import main (lazy)']
+    print(f"\nStartup saved per process: {saved * 1000:.1f} ms")
+    print(f"Heavy modules loaded by `import main`: {loaded_heavy_modules()}")
+    if missing:
+        print(f"Not installed here, so not counted in the eager baseline: {', '.join(missing)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class BrowserPool:
+    """
+    Keep headless browsers alive across screenshot jobs.
+
+    Drivers are created lazily up to `size`, handed out one job at a time,
+    reset (cookies, extra tabs) when returned and health-checked before
+    reuse. A driver that has served `max_pages` jobs, or that fails a health
+    check, is quit and replaced on the next request.
+    """
+
+    def __init__(self, factory, size=1, max_pages=50):
+        """
+        Args:
+            factory (callable): Creates a new WebDriver
+            size (int): Maximum number of live drivers
+            max_pages (int): Jobs a driver serves before it is recycled
+        """
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.idle = queue.LifoQueue()
+        self.pages = {}
+        self.lock = threading.Lock()
+        self.live = 0
+        self.closed = False
+
+    def _is_healthy(self, driver):
+        try:
+            driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        with self.lock:
+            self.live -= 1
+            self.pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _reset(self, driver):
+        """Close extra tabs, drop cookies and leave the driver on a blank page"""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    def acquire(self, timeout=None):
+        """
+        Get a healthy driver, starting a new one if the pool has room.
+
+        Raises:
+            queue.Empty: If no driver became free within `timeout` seconds
+        """
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    can_start = self.live < self.size
+                    if can_start:
+                        self.live += 1
+                if can_start:
+                    try:
+                        driver = self.factory()
+                    except Exception:
+                        with self.lock:
+                            self.live -= 1
+                        raise
+                    with self.lock:
+                        self.pages[id(driver)] = 0
+                    return driver
+                driver = self.idle.get(timeout=timeout)
+
+            if self._is_healthy(driver):
+                return driver
+            print("Browser failed health check, replacing it")
+            self._quit(driver)
+
+    def release(self, driver, broken=False):
+        """Return a driver to the pool, recycling it if it is worn out or broken"""
+        with self.lock:
+            self.pages[id(driver)] = self.pages.get(id(driver), 0) + 1
+            worn_out = self.pages[id(driver)] >= self.max_pages
+
+        if broken or worn_out or self.closed:
+            self._quit(driver)
+            return
+
+        try:
+            self._reset(driver)
+        except Exception as e:
+            print(f"Error resetting browser, replacing it: {e}")
+            self._quit(driver)
+            return
+        self.idle.put(driver)
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """Borrow a driver for the duration of a `with` block"""
+        driver = self.acquire(timeout=timeout)
+        broken = False
+        try:
+            yield driver
+        except Exception:
+            broken = not self._is_healthy(driver)
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    def close(self):
+        """Quit every idle driver; drivers still in use are quit when released"""
+        self.closed = True
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
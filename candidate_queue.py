@@ -0,0 +1,182 @@
+import json
+import os
+import random
+import threading
+import time
+
+from rate_limit import LOW, NORMAL, RateLimiter
+
+
+class CandidateQueue:
+    """
+    Prefetched, pre-filtered post candidates from every configured subreddit.
+
+    Hot listings are fetched for all subreddits at once and paged past the
+    first page until enough eligible posts are found. The filtered
+    candidates are cached on disk with a TTL, so later runs serve the next
+    post straight from the cache and only refetch a subreddit when its
+    entry is stale or used up.
+    """
+
+    def __init__(self, reddit, subreddits, cache_path, is_taken, ttl=1800,
+                 per_subreddit=10, page_size=25, max_pages=4, retry_interval=60, async_fetcher=None):
+        """
+        Args:
+            reddit (praw.Reddit): Reddit client
+            subreddits (list): Subreddits to draw candidates from
+            cache_path (str): JSON file holding cached candidates
+            is_taken (callable): Returns True for post ids that must not be served again
+            ttl (int): Seconds before a subreddit's cached candidates are refetched
+            per_subreddit (int): Eligible candidates to collect per subreddit
+            page_size (int): Listing page size
+            max_pages (int): Maximum pages to scan per subreddit
+            retry_interval (int): Minimum seconds between refetches of a used-up subreddit
+            async_fetcher (AsyncRedditFetcher): Fetch all stale listings concurrently (optional)
+        """
+        self.reddit = reddit
+        self.subreddits = list(subreddits)
+        self.cache_path = cache_path
+        self.is_taken = is_taken
+        self.ttl = ttl
+        self.per_subreddit = per_subreddit
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.retry_interval = retry_interval
+        self.async_fetcher = async_fetcher
+        self.lock = threading.Lock()
+        self.cache = self._load()
+
+    @staticmethod
+    def is_eligible(submission):
+        """SFW text posts with a real title"""
+        if submission.over_18:
+            return False
+        if not submission.selftext and not submission.title:
+            return False
+        # Skip posts that are too short
+        if len(submission.title) < 10:
+            return False
+        return True
+
+    def _load(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+            return {'fetched_at': cache.get('fetched_at', {}), 'candidates': cache.get('candidates', {})}
+        except (OSError, json.JSONDecodeError):
+            return {'fetched_at': {}, 'candidates': {}}
+
+    def _save(self):
+        tmp_path = f"{self.cache_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _available(self, subreddit_name):
+        return [
+            c for c in self.cache['candidates'].get(subreddit_name, [])
+            if not self.is_taken(c['id'])
+        ]
+
+    def _needs_refresh(self, subreddit_name):
+        age = time.time() - self.cache['fetched_at'].get(subreddit_name, 0)
+        if age > self.ttl:
+            return True
+        return not self._available(subreddit_name) and age > self.retry_interval
+
+    def fetch_listing(self, subreddit_name):
+        """
+        Scan a subreddit's hot listing, page by page, for eligible posts.
+
+        Returns:
+            list: Candidate dicts (id, subreddit, title) in hot order
+        """
+        subreddit = self.reddit.subreddit(subreddit_name)
+        return self.filter_listing(subreddit_name, subreddit.hot(limit=self.page_size * self.max_pages))
+
+    def filter_listing(self, subreddit_name, submissions):
+        """Keep the first `per_subreddit` eligible, untaken submissions"""
+        candidates = []
+        for submission in submissions:
+            if self.is_taken(submission.id) or not self.is_eligible(submission):
+                continue
+            candidates.append({'id': submission.id, 'subreddit': subreddit_name, 'title': submission.title})
+            if len(candidates) >= self.per_subreddit:
+                break
+        return candidates
+
+    def store_listing(self, subreddit_name, candidates):
+        """Replace the cached candidates of a subreddit"""
+        with self.lock:
+            self.cache['candidates'][subreddit_name] = candidates
+            self.cache['fetched_at'][subreddit_name] = time.time()
+            self._save()
+
+    def refresh(self, subreddits=None):
+        """Refetch listings for `subreddits` (default: every configured subreddit)"""
+        subreddits = subreddits or self.subreddits
+        if self.async_fetcher:
+            print(f"Fetching posts from {', '.join('r/' + s for s in subreddits)}...")
+            try:
+                listings = self.async_fetcher.fetch_listings(subreddits, self.page_size * self.max_pages)
+            except Exception as e:
+                print(f"Error fetching Reddit posts: {e}")
+                listings = {}
+            for subreddit_name, listing in listings.items():
+                if isinstance(listing, Exception):
+                    print(f"Error fetching Reddit posts from r/{subreddit_name}: {listing}")
+                else:
+                    self.store_listing(subreddit_name, self.filter_listing(subreddit_name, listing))
+            return
+
+        for subreddit_name in subreddits:
+            print(f"Fetching posts from r/{subreddit_name}...")
+            try:
+                self.store_listing(subreddit_name, self.fetch_listing(subreddit_name))
+            except Exception as e:
+                print(f"Error fetching Reddit posts from r/{subreddit_name}: {e}")
+
+    def next_candidate(self, subreddit_name=None):
+        """
+        Take the next eligible candidate, refreshing stale or exhausted subreddits first.
+
+        Args:
+            subreddit_name (str): Only serve posts from this subreddit (default: any configured one)
+
+        Returns:
+            dict: Candidate (id, subreddit, title), or None
+        """
+        subreddits = [subreddit_name] if subreddit_name else self.subreddits
+        with self.lock:
+            needs_refresh = [s for s in subreddits if self._needs_refresh(s)]
+            # With stock already on hand the refetch is only a prefetch; let urgent requests go first
+            speculative = any(self._available(s) for s in subreddits)
+        if needs_refresh:
+            with RateLimiter.priority(LOW if speculative else NORMAL):
+                self.refresh(needs_refresh)
+
+        with self.lock:
+            stocked = [s for s in subreddits if self._available(s)]
+            if not stocked:
+                return None
+            chosen_subreddit = random.choice(stocked)
+            candidate = self._available(chosen_subreddit)[0]
+            self.cache['candidates'][chosen_subreddit] = [
+                c for c in self.cache['candidates'][chosen_subreddit] if c['id'] != candidate['id']
+            ]
+            self._save()
+        return candidate
+
+    def next(self, subreddit_name=None):
+        """
+        Take the next eligible post as a submission.
+
+        Returns:
+            praw.models.Submission: Lazy submission with `subreddit_name` set, or None
+        """
+        candidate = self.next_candidate(subreddit_name)
+        if candidate is None:
+            return None
+        submission = self.reddit.submission(id=candidate['id'])
+        submission.subreddit_name = candidate['subreddit']
+        return submission
@@ -0,0 +1,160 @@
+import os
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Fonts tried in order; the first one Pillow can open is used
+FONT_CANDIDATES = {
+    'regular': ["DejaVuSans.ttf", "arial.ttf", "Arial.ttf", "LiberationSans-Regular.ttf"],
+    'bold': ["DejaVuSans-Bold.ttf", "arialbd.ttf", "Arial Bold.ttf", "LiberationSans-Bold.ttf"],
+}
+
+
+@lru_cache(maxsize=None)
+def load_font(style, size):
+    """Load (and cache) a TrueType font, falling back to Pillow's built-in font"""
+    for name in FONT_CANDIDATES[style]:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1 has a single fixed-size default font
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=4096)
+def wrap_text(text, style, size, max_width):
+    """Word-wrap `text` to lines no wider than `max_width` pixels (cached per text and font)"""
+    font = load_font(style, size)
+    lines = []
+    for paragraph in text.split('\n'):
+        line = ''
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if font.getlength(candidate) <= max_width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            # Hard-split words that are wider than a whole line on their own
+            while font.getlength(word) > max_width and len(word) > 1:
+                cut = len(word)
+                while cut > 1 and font.getlength(word[:cut]) > max_width:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+            line = word
+        lines.append(line)
+    return tuple(lines)
+
+
+class CardRenderer:
+    """
+    Draw post and comment cards straight from Reddit data with Pillow.
+
+    Produces the same dict as RedditVideoGenerator.take_screenshot ('post',
+    'comment_<i>' -> PNG path) without a browser.
+    """
+
+    BACKGROUND = (26, 26, 27)
+    TEXT = (215, 218, 220)
+    MUTED = (129, 131, 132)
+    ACCENT = (255, 69, 0)
+
+    def __init__(self, output_dir, width=1080, padding=40, max_body_lines=40):
+        """
+        Args:
+            output_dir (str): Directory to write card images to
+            width (int): Card width in pixels
+            padding (int): Inner padding in pixels
+            max_body_lines (int): Body text beyond this many lines is cut off
+        """
+        self.output_dir = output_dir
+        self.width = width
+        self.padding = padding
+        self.max_body_lines = max_body_lines
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _line_height(self, style, size):
+        left, top, right, bottom = load_font(style, size).getbbox("Ag")
+        return int((bottom - top) * 1.4)
+
+    def render_card(self, path, header, body, score, title=None):
+        """
+        Draw one card and save it as a PNG.
+
+        Args:
+            path (str): Output file path
+            header (str): Small grey line at the top (subreddit/author)
+            body (str): Main text
+            score (int): Upvote count shown in the footer
+            title (str): Bold title above the body (posts only)
+
+        Returns:
+            str: Path to the saved image
+        """
+        text_width = self.width - 2 * self.padding
+        blocks = [('regular', 26, self.MUTED, (header,))]
+        if title:
+            blocks.append(('bold', 40, self.TEXT, wrap_text(title, 'bold', 40, text_width)))
+        if body:
+            lines = wrap_text(body, 'regular', 32, text_width)
+            if len(lines) > self.max_body_lines:
+                lines = lines[:self.max_body_lines - 1] + (lines[self.max_body_lines - 1] + " ...",)
+            blocks.append(('regular', 32, self.TEXT, lines))
+        blocks.append(('bold', 26, self.ACCENT, (f"↑ {score:,} points",)))
+
+        block_gap = 20
+        height = 2 * self.padding + block_gap * (len(blocks) - 1) + sum(
+            self._line_height(style, size) * len(lines) for style, size, _, lines in blocks
+        )
+
+        image = Image.new("RGB", (self.width, height), self.BACKGROUND)
+        draw = ImageDraw.Draw(image)
+        y = self.padding
+        for style, size, color, lines in blocks:
+            font = load_font(style, size)
+            line_height = self._line_height(style, size)
+            for line in lines:
+                draw.text((self.padding, y), line, font=font, fill=color)
+                y += line_height
+            y += block_gap
+
+        image.save(path)
+        return path
+
+    def render(self, post_data, comments_data):
+        """
+        Draw the post card and one card per comment.
+
+        Returns:
+            dict: 'post' and 'comment_<i>' -> image path
+        """
+        cards = {}
+        try:
+            post_path = os.path.join(self.output_dir, f"post_{post_data['id']}.png")
+            cards['post'] = self.render_card(
+                post_path,
+                f"r/{post_data.get('subreddit', '')} • Posted by u/{post_data.get('author', '[deleted]')}",
+                post_data.get('text', ''),
+                post_data.get('score', 0),
+                title=post_data['title']
+            )
+            print(f"Post card saved: {os.path.basename(post_path)}")
+
+            for i, comment in enumerate(comments_data):
+                comment_path = os.path.join(self.output_dir, f"comment_{comment['id']}.png")
+                cards[f'comment_{i}'] = self.render_card(
+                    comment_path,
+                    f"u/{comment.get('author', '[deleted]')}",
+                    comment['body'],
+                    comment.get('score', 0)
+                )
+                print(f"Comment card saved: {os.path.basename(comment_path)}")
+        except Exception as e:
+            print(f"Error rendering cards: {e}")
+
+        return cards
@@ -0,0 +1,126 @@
+import heapq
+import itertools
+from collections import deque
+
+
+class CommentSelector:
+    """
+    Pick the best top-level comments of a post without loading the whole tree.
+
+    Comments are streamed through a bounded min-heap that keeps the `k` best
+    seen so far. "Load more" stubs (MoreComments) are only expanded while
+    there is request budget left and the comments behind them could still
+    make the cut. With comment_sort='top', nothing behind a stub outscores
+    the last comment before it, so once the heap is full and its weakest
+    entry beats that score, the rest of the tree is skipped.
+    """
+
+    comment_sort = 'top'
+
+    def __init__(self, max_comments=5, max_words=100, min_words=5, request_budget=3, min_score=None, key=None):
+        """
+        Args:
+            max_comments (int): Number of comments to keep (k)
+            max_words (int): Longest acceptable comment, in words
+            min_words (int): Shortest acceptable comment, in words
+            request_budget (int): Maximum MoreComments expansions (API requests)
+            min_score (int): Ignore comments below this score (optional)
+            key (callable): Ranks comment dicts, higher is better (default: score)
+        """
+        self.max_comments = max_comments
+        self.max_words = max_words
+        self.min_words = min_words
+        self.request_budget = request_budget
+        self.min_score = min_score
+        self.key = key
+
+    def is_acceptable(self, comment):
+        if not hasattr(comment, 'body') or comment.body in ['[deleted]', '[removed]']:
+            return False
+        word_count = len(comment.body.split())
+        if word_count > self.max_words or word_count < self.min_words:
+            return False
+        if self.min_score is not None and comment.score < self.min_score:
+            return False
+        return True
+
+    def rank(self, comment_data):
+        return self.key(comment_data) if self.key else comment_data['score']
+
+    def select(self, submission):
+        """
+        Stream the comment forest and return the best comments.
+
+        Returns:
+            list: Comment dicts (id, body, score, author), best first
+        """
+        selection = self._select(submission)
+        try:
+            more = next(selection)
+            while True:
+                more = selection.send(more.comments())
+        except StopIteration as done:
+            return done.value
+
+    async def select_async(self, submission):
+        """Same as select() for an asyncpraw submission that has been loaded"""
+        selection = self._select(submission)
+        try:
+            more = next(selection)
+            while True:
+                more = selection.send(await more.comments())
+        except StopIteration as done:
+            return done.value
+
+    def _select(self, submission):
+        """
+        Selection loop shared by the sync and async clients.
+
+        Yields each MoreComments stub it wants expanded and expects the
+        expanded children to be sent back; returns the selected comments.
+        """
+        # Pruning is only sound when the listing is sorted by the score we rank by
+        can_prune = self.key is None and getattr(submission, 'comment_sort', None) == 'top'
+        top_level_parent = f"t3_{submission.id}"
+
+        heap = []
+        counter = itertools.count()
+        pending = deque(submission.comments)
+        last_score = None
+        requests = 0
+
+        while pending:
+            item = pending.popleft()
+
+            # Expanded stubs can contain replies and reply-level stubs; only top-level
+            # comments are narrated, so neither is worth a look (or a request)
+            if getattr(item, 'parent_id', top_level_parent) != top_level_parent:
+                continue
+
+            # praw and asyncpraw each have their own MoreComments class
+            if type(item).__name__ == 'MoreComments':
+                if can_prune and len(heap) >= self.max_comments and last_score is not None and last_score <= heap[0][0]:
+                    continue
+                if requests >= self.request_budget:
+                    continue
+                requests += 1
+                pending.extend((yield item))
+                continue
+
+            last_score = item.score
+            if not self.is_acceptable(item):
+                continue
+
+            comment_data = {
+                'id': item.id,
+                'body': item.body,
+                'score': item.score,
+                'author': str(item.author) if item.author else '[deleted]'
+            }
+            entry = (self.rank(comment_data), next(counter), comment_data)
+            if len(heap) < self.max_comments:
+                heapq.heappush(heap, entry)
+            elif entry[0] > heap[0][0]:
+                heapq.heapreplace(heap, entry)
+
+        return [comment_data for _, _, comment_data in sorted(heap, key=lambda e: (-e[0], e[1]))]
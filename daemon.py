@@ -0,0 +1,210 @@
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class VideoDaemon:
+    """
+    Long-running video service around one warm RedditVideoGenerator.
+
+    The Reddit client, post store, TTS workers, browsers and YouTube
+    credentials are set up once and reused by every job. Jobs come from a
+    schedule (one video every `interval` seconds) and from a small JSON
+    control interface on localhost:
+
+        GET  /status                       daemon, queue and upload spool state
+        POST /enqueue {"count", "subreddit"} queue videos now
+        POST /pause, POST /resume          stop/restart taking new jobs
+        POST /stop                         finish the current job and exit
+
+    POSTs must be sent as Content-Type: application/json. Browsers cannot
+    send that cross-origin without a CORS preflight, which this server never
+    approves, so a web page open on the same machine cannot drive the daemon.
+    """
+
+    def __init__(self, generator, interval=None, subreddit=None, auto_upload=True,
+                 host='127.0.0.1', port=8765):
+        """
+        Args:
+            generator (RedditVideoGenerator): Generator whose clients stay warm
+            interval (float): Seconds between scheduled videos (None: only make queued videos)
+            subreddit (str): Subreddit for scheduled videos (default: any story subreddit)
+            auto_upload (bool): Queue finished videos for upload
+            host (str): Control interface address (keep it on localhost)
+            port (int): Control interface port
+        """
+        self.generator = generator
+        self.interval = interval
+        self.subreddit = subreddit
+        self.auto_upload = auto_upload
+        self.host = host
+        self.port = port
+        self.requests = queue.Queue()
+        self.paused = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.current = None
+        self.started_at = None
+        self.next_run_at = None
+        self.stats = {'requested': 0, 'completed': 0, 'failed': 0}
+        self.server = None
+
+    def warm_up(self):
+        """Start the long-lived workers before the first job needs them"""
+        try:
+            self.generator.connect_reddit()
+        except Exception as e:
+            print(f"Error connecting to Reddit: {e}")
+        self.generator.narration.start()
+        if self.generator.renderer == 'browser':
+            try:
+                with self.generator.browser_pool.driver():
+                    pass
+            except Exception as e:
+                print(f"Error starting browser: {e}")
+        if self.auto_upload:
+            self.generator.start_uploads()
+
+    def enqueue(self, count=1, subreddit=None):
+        """Queue `count` videos to be made as soon as possible"""
+        count = max(1, int(count))
+        self.requests.put({'count': count, 'subreddit': subreddit, 'source': 'manual'})
+        with self.lock:
+            self.stats['requested'] += count
+        return self.requests.qsize()
+
+    def pause(self):
+        self.paused.set()
+
+    def resume(self):
+        self.paused.clear()
+
+    def stop(self):
+        self.stopping.set()
+
+    def status(self):
+        with self.lock:
+            return {
+                'paused': self.paused.is_set(),
+                'current': self.current,
+                'queued': self.requests.qsize(),
+                'interval': self.interval,
+                'next_scheduled_run': self.next_run_at,
+                'uptime': time.time() - self.started_at if self.started_at else 0,
+                'uploads': self.generator.upload_spool.counts(),
+                **self.stats,
+            }
+
+    def _next_request(self):
+        """Wait for a queued request or the next scheduled run; None when stopping"""
+        while not self.stopping.is_set():
+            if self.paused.is_set():
+                self.stopping.wait(1)
+                continue
+            try:
+                return self.requests.get(timeout=1)
+            except queue.Empty:
+                pass
+            if self.next_run_at is not None and time.time() >= self.next_run_at:
+                self.next_run_at += self.interval
+                # After a long job, skip the runs we missed instead of bursting to catch up
+                self.next_run_at = max(self.next_run_at, time.time())
+                with self.lock:
+                    self.stats['requested'] += 1
+                return {'count': 1, 'subreddit': self.subreddit, 'source': 'schedule'}
+        return None
+
+    def _run(self, request):
+        with self.lock:
+            self.current = {**request, 'started_at': time.time()}
+        try:
+            if request['count'] > 1:
+                results = self.generator.run_batch(
+                    request['count'], subreddit=request['subreddit'], auto_upload=self.auto_upload
+                )
+            else:
+                result = self.generator.generate_and_upload_video(
+                    subreddit=request['subreddit'], auto_upload=self.auto_upload, interactive=False
+                )
+                results = [result] if result else []
+        except Exception as e:
+            print(f"Error running job: {e}")
+            results = []
+        with self.lock:
+            self.stats['completed'] += len(results)
+            self.stats['failed'] += request['count'] - len(results)
+            self.current = None
+
+    def serve_forever(self):
+        """Run jobs until /stop or Ctrl+C"""
+        self.started_at = time.time()
+        if self.interval:
+            self.next_run_at = self.started_at
+        self.warm_up()
+        self.server = ThreadingHTTPServer((self.host, self.port), _control_handler(self))
+        threading.Thread(target=self.server.serve_forever, name="daemon-control", daemon=True).start()
+        print(f"🛰️ Daemon listening on http://{self.host}:{self.port}")
+
+        try:
+            while True:
+                request = self._next_request()
+                if request is None:
+                    break
+                self._run(request)
+        except KeyboardInterrupt:
+            print("\nStopping daemon...")
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+            self.generator.wait_for_uploads()
+
+
+def _control_handler(daemon):
+    class ControlHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/status':
+                self._reply(200, daemon.status())
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if content_type != 'application/json':
+                self._reply(415, {'error': 'Content-Type must be application/json'})
+                return
+            if self.path == '/enqueue':
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    options = json.loads(self.rfile.read(length) or b'{}')
+                    queued = daemon.enqueue(options.get('count', 1), options.get('subreddit'))
+                except (ValueError, TypeError, AttributeError) as e:
+                    self._reply(400, {'error': str(e)})
+                    return
+                self._reply(200, {'queued': queued})
+            elif self.path == '/pause':
+                daemon.pause()
+                self._reply(200, {'paused': True})
+            elif self.path == '/resume':
+                daemon.resume()
+                self._reply(200, {'paused': False})
+            elif self.path == '/stop':
+                daemon.stop()
+                self._reply(200, {'stopping': True})
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def log_message(self, format, *args):
+            # Keep request logs out of the job output
+            pass
+
+    return ControlHandler
@@ -1,7 +1,6 @@
 import praw
 import pyttsx3
 import os
-import json
 import time
 import random
 from selenium import webdriver
@@ -14,6 +13,8 @@ from moviepy.editor import *
 from datetime import datetime
 import dotenv
 
+from post_store import ProcessedPostStore
+
 # Enhanced environment loading
 dotenv.load_dotenv()
 my_client_id = os.getenv("REDDIT_CLIENT_ID") or os.getenv("YOUR_CLIENT_ID")
@@ -83,10 +84,7 @@ REDDIT_CLIENT_SECRET=your_secret_here
     def load_processed_posts(self):
         """Load processed posts safely"""
         try:
-            if os.path.exists("processed_posts.json"):
-                with open("processed_posts.json", 'r') as f:
-                    return set(json.load(f))
-            return set()
+            return ProcessedPostStore("processed_posts.db", legacy_json_path="processed_posts.json")
         except Exception as e:
             print(f"⚠️ Error loading processed posts: {e}")
             return set()
@@ -0,0 +1,448 @@
+import contextvars
+import functools
+import math
+import os
+import re
+import shutil
+import tempfile
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+
+from file_cache import FileCache, file_hash, hash_key, link_or_copy
+from metrics import run_process
+
+# Bump when the layout of a rendered segment changes, to retire old cache entries
+SEGMENT_FORMAT = 1
+
+
+def ffmpeg_binary():
+    """Locate ffmpeg: $FFMPEG_BINARY, then PATH, then the copy bundled with imageio-ffmpeg"""
+    binary = os.getenv("FFMPEG_BINARY") or shutil.which("ffmpeg")
+    if binary:
+        return binary
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_version(binary):
+    """
+    (major, minor) of an ffmpeg build, from `ffmpeg -version`.
+
+    Git snapshots ("N-109...") carry no release number; they are treated as
+    newer than any release.
+    """
+    result = run_process([binary, "-hide_banner", "-version"])
+    match = re.search(r"version n?(\d+)\.(\d+)", result.stdout)
+    if not match:
+        return (math.inf, 0)
+    return int(match.group(1)), int(match.group(2))
+
+
+def vfr_args():
+    """Variable frame rate output: -fps_mode arrived in ffmpeg 5.1, older builds only know -vsync"""
+    if ffmpeg_version(ffmpeg_binary()) >= (5, 1):
+        return ["-fps_mode", "vfr"]
+    return ["-vsync", "vfr"]
+
+
+def probe_media(path):
+    """
+    Read duration, frame size, fps and audio presence from `ffmpeg -i` output.
+
+    Returns:
+        dict: duration (s), width, height, fps (None if no video), has_audio
+    """
+    result = run_process([ffmpeg_binary(), "-hide_banner", "-i", path])
+    output = result.stderr
+
+    info = {'duration': None, 'width': None, 'height': None, 'fps': None, 'has_audio': False}
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", output)
+    if match:
+        hours, minutes, seconds = match.groups()
+        info['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    for line in output.splitlines():
+        if "Video:" in line and info['width'] is None:
+            size = re.search(r", (\d{2,5})x(\d{2,5})", line)
+            if size:
+                info['width'], info['height'] = int(size.group(1)), int(size.group(2))
+            fps = re.search(r", (\d+(?:\.\d+)?) (?:fps|tbr)", line)
+            if fps:
+                info['fps'] = float(fps.group(1))
+        elif "Audio:" in line:
+            info['has_audio'] = True
+    if info['duration'] is None:
+        raise ValueError(f"Could not read media info for {path}")
+    return info
+
+
+def audio_duration(path):
+    """Duration of an audio file in seconds (WAV headers are read directly)"""
+    if path.lower().endswith('.wav'):
+        try:
+            with wave.open(path, 'rb') as audio:
+                return audio.getnframes() / float(audio.getframerate())
+        except wave.Error:
+            pass
+    return probe_media(path)['duration']
+
+
+def _even(value):
+    return value + (value % 2)
+
+
+class FFmpegRenderer:
+    """
+    Render a video with a single ffmpeg filter graph.
+
+    Produces the same layout as the moviepy path in
+    RedditVideoGenerator.create_video: the card segments are centered on a
+    transparent canvas the size of the largest card and concatenated, and that strip is
+    scaled to half the background height and overlaid centered on the
+    (looped) background. Narration is mixed with the background's own audio.
+    All frame work happens inside ffmpeg, with no per-frame Python.
+
+    With `still_image` on, the encoder is told the cards are static. Without
+    a background every frame of a segment is the same picture, so each card
+    is emitted at `still_fps` as a variable-frame-rate stream and encoded
+    with x264's stillimage tuning and long GOPs. With a background only the
+    GOP is stretched; x264 already skips the unchanged card area in P-frames.
+
+    render_segmented() is the bounded-memory alternative: one ffmpeg process
+    per card, joined afterwards with a stream-copy concat. Its cards sit on
+    a fixed `segment_canvas` (larger ones are scaled down to fit), so a
+    segment's frame never depends on the other cards. With a cache
+    directory, rendered segments are kept under a hash of their inputs, so
+    a re-render only redoes the cards that changed.
+    """
+
+    def __init__(self, fps=24, codec='libx264', audio_codec='aac', preset='medium',
+                 still_image=True, still_fps=2, keyframe_seconds=10,
+                 segment_canvas=(1080, 1080), cache_dir=None, cache_max_bytes=1024 * 1024 * 1024):
+        """
+        Args:
+            fps (int): Output frame rate
+            codec (str): Video codec
+            audio_codec (str): Audio codec
+            preset (str): x264 preset
+            still_image (bool): Use still-image aware encoding for static card spans
+            still_fps (int): Frame rate of static card spans when there is no background
+            keyframe_seconds (int): Maximum keyframe interval in seconds
+            segment_canvas (tuple): Card canvas (width, height) of segmented renders
+            cache_dir (str): Directory for rendered segments (None disables caching)
+            cache_max_bytes (int): Byte budget for the segment cache
+        """
+        self.fps = fps
+        self.codec = codec
+        self.audio_codec = audio_codec
+        self.preset = preset
+        self.still_image = still_image
+        self.still_fps = still_fps
+        self.keyframe_seconds = keyframe_seconds
+        self.segment_canvas = (_even(segment_canvas[0]), _even(segment_canvas[1]))
+        self.segment_cache = FileCache(cache_dir, cache_max_bytes, suffix='.mkv') if cache_dir else None
+
+    def _still_framerate(self, duration):
+        """Frame rate that fits a whole number of frames (at least still_fps) into `duration`"""
+        frames = max(1, math.ceil(duration * self.still_fps))
+        return Fraction(frames * 1000, max(1, round(duration * 1000)))
+
+    def encoding_args(self, static):
+        """x264 arguments for a render; `static` means no frame changes within a segment"""
+        args = ["-c:v", self.codec, "-preset", self.preset, "-pix_fmt", "yuv420p"]
+        if not self.still_image:
+            return args + ["-r", str(self.fps)]
+        if static:
+            return args + [
+                "-tune", "stillimage",
+                "-g", str(self.still_fps * self.keyframe_seconds),
+                *vfr_args()
+            ]
+        return args + ["-r", str(self.fps), "-g", str(self.fps * self.keyframe_seconds)]
+
+    @staticmethod
+    def canvas_size(segments):
+        """(width, height) of the canvas every card is centered on: the largest card, rounded up to even"""
+        from PIL import Image
+
+        sizes = []
+        for image_path, _ in segments:
+            with Image.open(image_path) as image:
+                sizes.append(image.size)
+        return _even(max(w for w, _ in sizes)), _even(max(h for _, h in sizes))
+
+    def build_command(self, segments, output_path, background_path=None, background_offset=0,
+                      durations=None, canvas=None, audio_codec=None):
+        """
+        Build the ffmpeg command line.
+
+        Args:
+            segments (list): (image_path, audio_path) pairs, in playback order
+            output_path (str): Where to write the video
+            background_path (str): Background video to overlay the cards on (optional)
+            background_offset (float): Where to start in the background, in seconds
+            durations (list): Seconds each segment lasts (default: its narration length)
+            canvas (tuple): Card canvas (width, height); larger cards are scaled down to fit (default: fit these segments)
+            audio_codec (str): Audio codec (default: self.audio_codec)
+
+        Returns:
+            list: ffmpeg arguments
+        """
+        if durations is None:
+            durations = [audio_duration(audio_path) for _, audio_path in segments]
+        total = sum(durations)
+        width, height = canvas or self.canvas_size(segments)
+
+        static = self.still_image and not background_path
+
+        inputs = []
+        filters = []
+        concat_inputs = ""
+        for i, ((image_path, audio_path), duration) in enumerate(zip(segments, durations)):
+            framerate = self._still_framerate(duration) if static else self.fps
+            inputs += ["-loop", "1", "-framerate", str(framerate), "-t", f"{duration:.3f}", "-i", image_path]
+            inputs += ["-i", audio_path]
+            # Static spans keep their own (low) frame rate; a common time base lets concat join them
+            timing = "settb=1/1000" if static else f"fps={self.fps}"
+            filters.append(
+                f"[{2 * i}:v]format=rgba,"
+                f"scale='min(iw,{width})':'min(ih,{height})':force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color=black@0,"
+                f"setsar=1,{timing}[v{i}]"
+            )
+            filters.append(
+                f"[{2 * i + 1}:a]aformat=sample_rates=44100:channel_layouts=stereo,"
+                f"apad,atrim=0:{duration:.3f}[a{i}]"
+            )
+            concat_inputs += f"[v{i}][a{i}]"
+        filters.append(f"{concat_inputs}concat=n={len(segments)}:v=1:a=1[main][narration]")
+
+        video_label, audio_label = "[outv]", "[narration]"
+        if background_path:
+            background = probe_media(background_path)
+            bg_index = 2 * len(segments)
+            # Input seeking jumps straight to the keyframe at the offset
+            inputs += ["-ss", f"{background_offset:.3f}", "-stream_loop", "-1", "-i", background_path]
+            card_height = _even(background['height'] // 2)
+            filters.append(f"[main]scale=-2:{card_height}[cards]")
+            filters.append(
+                f"[{bg_index}:v][cards]overlay=(W-w)/2:(H-h)/2:shortest=1,format=yuv420p[outv]"
+            )
+            if background['has_audio']:
+                filters.append(
+                    f"[{bg_index}:a]aformat=sample_rates=44100:channel_layouts=stereo[bga]"
+                )
+                filters.append("[narration][bga]amix=inputs=2:duration=first:normalize=0[outa]")
+                audio_label = "[outa]"
+        else:
+            filters.append("[main]format=yuv420p[outv]")
+
+        return [
+            ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y",
+            *inputs,
+            "-filter_complex", ";".join(filters),
+            "-map", video_label, "-map", audio_label,
+            "-t", f"{total:.3f}",
+            *self.encoding_args(static),
+            "-c:a", audio_codec or self.audio_codec,
+            *(["-movflags", "+faststart"] if output_path.endswith('.mp4') else []),
+            output_path
+        ]
+
+    def render(self, segments, output_path, background_path=None, background_offset=0):
+        """
+        Render `segments` to `output_path` in one ffmpeg process.
+
+        Returns:
+            str: output_path
+
+        Raises:
+            RuntimeError: If ffmpeg is missing or fails
+        """
+        if not ffmpeg_binary():
+            raise RuntimeError("ffmpeg not found")
+        command = self.build_command(segments, output_path, background_path, background_offset)
+        result = run_process(command)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
+        return output_path
+
+    def segment_durations(self, segments, static):
+        """
+        Narration lengths, rounded so each segment holds a whole number of frames.
+
+        Segments rendered on their own must end exactly where their video
+        ends, or audio and video drift apart a little more at every join.
+        """
+        durations = []
+        for _, audio_path in segments:
+            duration = audio_duration(audio_path)
+            if static:
+                durations.append(max(0.001, round(duration, 3)))
+            else:
+                durations.append(math.ceil(duration * self.fps) / self.fps)
+        return durations
+
+    def render_segment(self, segment, output_path, duration, background_path=None, background_offset=0):
+        """
+        Render one card and its narration on its own, ready to be joined by concat().
+
+        Audio is kept as PCM so the joins stay gapless; it is encoded once, in concat().
+
+        Raises:
+            RuntimeError: If ffmpeg fails
+        """
+        command = self.build_command(
+            [segment], output_path, background_path, background_offset,
+            durations=[duration], canvas=self.segment_canvas, audio_codec='pcm_s16le'
+        )
+        result = run_process(command)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed on {os.path.basename(segment[0])}: {result.stderr.strip()[-500:]}")
+        return output_path
+
+    def concat(self, segment_paths, output_path):
+        """
+        Join rendered segments with the concat demuxer.
+
+        The video streams are copied as they are; only the PCM audio is
+        encoded, which takes a fraction of the video encode.
+        """
+        list_fd, list_path = tempfile.mkstemp(suffix='.txt', dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            with os.fdopen(list_fd, 'w') as f:
+                for path in segment_paths:
+                    escaped = os.path.abspath(path).replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            command = [
+                ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y",
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                "-map", "0:v", "-map", "0:a",
+                "-c:v", "copy", "-c:a", self.audio_codec,
+                "-movflags", "+faststart",
+                output_path
+            ]
+            result = run_process(command)
+            if result.returncode != 0:
+                raise RuntimeError(f"ffmpeg concat failed: {result.stderr.strip()[-500:]}")
+        finally:
+            os.remove(list_path)
+        return output_path
+
+    @staticmethod
+    def segment_id(segment):
+        """Identity of a segment across re-renders: the bytes of its card and narration"""
+        image_path, audio_path = segment
+        return hash_key(file_hash(image_path), file_hash(audio_path))
+
+    def plan_segments(self, segments, background_path=None, background_offset=0, offsets=None):
+        """
+        Lay out a segmented render.
+
+        Args:
+            segments (list): (image_path, audio_path) pairs, in playback order
+            background_path (str): Background video (optional)
+            background_offset (float): Where the first new segment starts in the background
+            offsets (dict): segment id -> background offset from an earlier render
+
+        Returns:
+            list: (segment, segment id, duration, background offset) per segment
+        """
+        static = self.still_image and not background_path
+        durations = self.segment_durations(segments, static)
+        background_duration = probe_media(background_path)['duration'] if background_path else None
+        offsets = offsets or {}
+
+        plan = []
+        start = background_offset
+        for segment, duration in zip(segments, durations):
+            segment_id = self.segment_id(segment)
+            if not background_duration:
+                offset = 0
+            elif segment_id in offsets:
+                # Unchanged segments keep their slice, so they match their cached renders
+                offset = offsets[segment_id]
+            else:
+                # New segments pick up the background where the previous one left off
+                offset = start % background_duration
+            plan.append((segment, segment_id, duration, offset))
+            start = offset + duration
+        return plan
+
+    def segment_key(self, segment_id, duration, background_path=None, background_offset=0):
+        """Cache key of a rendered segment: its card and narration bytes, background slice and render profile"""
+        background = None
+        if background_path:
+            stat = os.stat(background_path)
+            background = (os.path.abspath(background_path), stat.st_size, stat.st_mtime)
+        profile = (
+            SEGMENT_FORMAT, self.fps, self.codec, self.preset,
+            self.still_image, self.still_fps, self.keyframe_seconds, self.segment_canvas
+        )
+        return hash_key(segment_id, round(duration, 6), background, round(background_offset, 3), profile)
+
+    def render_segmented(self, segments, output_path, background_path=None, background_offset=0, workers=1,
+                         offsets=None):
+        """
+        Render each segment over its slice of the background into its own
+        file, then join them without re-encoding the video.
+
+        Only one card (and its stretch of background) is in flight per
+        ffmpeg process, so peak memory stays flat however long the video
+        is, and up to `workers` segments render at once.
+
+        Args:
+            offsets (dict): segment id -> background offset. Segments listed
+                keep that slice of the background; the offsets picked for the
+                others are added, so the caller can keep them for re-renders.
+
+        Returns:
+            str: output_path
+
+        Raises:
+            RuntimeError: If ffmpeg is missing or any segment fails
+        """
+        if not ffmpeg_binary():
+            raise RuntimeError("ffmpeg not found")
+        plan = self.plan_segments(segments, background_path, background_offset, offsets)
+        if offsets is not None and background_path:
+            offsets.update((segment_id, offset) for _, segment_id, _, offset in plan)
+
+        segment_dir = tempfile.mkdtemp(prefix='segments_', dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            def render_one(item):
+                i, (segment, segment_id, duration, offset) = item
+                path = os.path.join(segment_dir, f"segment_{i:03d}.mkv")
+                if self.segment_cache is None:
+                    return self.render_segment(segment, path, duration, background_path, offset), False
+
+                key = self.segment_key(segment_id, duration, background_path, offset)
+                cached = self.segment_cache.get(key)
+                if cached:
+                    try:
+                        # Pin the entry for the concat; eviction may remove it meanwhile
+                        link_or_copy(cached, path)
+                        return path, True
+                    except OSError:
+                        pass
+                self.render_segment(segment, path, duration, background_path, offset)
+                # Stored as soon as it is done, so a crashed render keeps the finished segments
+                try:
+                    self.segment_cache.put(key, path)
+                except OSError as e:
+                    print(f"Error caching segment {i}: {e}")
+                return path, False
+
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                # Each task runs in a copy of this context, so ffmpeg's CPU lands in the caller's span
+                futures = [executor.submit(contextvars.copy_context().run, render_one, item) for item in enumerate(plan)]
+                rendered = [future.result() for future in futures]
+            if self.segment_cache is not None:
+                print(f"Reused {sum(hit for _, hit in rendered)}/{len(plan)} rendered segments")
+            return self.concat([path for path, _ in rendered], output_path)
+        finally:
+            shutil.rmtree(segment_dir, ignore_errors=True)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+
+def hash_key(*parts):
+    """Build a stable cache key from JSON-serializable parts"""
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source, destination):
+    """Hard-link `source` to `destination`, copying when linking is not possible"""
+    tmp_path = f"{destination}.tmp{os.getpid()}.{threading.get_ident()}"
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+class FileCache:
+    """
+    Content-addressed file cache with least-recently-used eviction.
+
+    Entries are plain files named after their key. A hit refreshes the file's
+    modification time, and eviction removes the oldest files first until the
+    cache fits its byte budget.
+    """
+
+    def __init__(self, directory, max_bytes, suffix=''):
+        """
+        Args:
+            directory (str): Directory holding the cached files
+            max_bytes (int): Byte budget for the whole cache (None: never evict)
+            suffix (str): File extension for entries (e.g. '.wav')
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get(self, key):
+        """
+        Look up an entry.
+
+        Returns:
+            str: Path to the cached file or None on a miss
+        """
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, source_path):
+        """
+        Store a copy of `source_path` under `key`.
+
+        Returns:
+            str: Path to the cached file
+        """
+        path = self.path_for(key)
+        link_or_copy(source_path, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its budget"""
+        if self.max_bytes is None:
+            return
+        with self.lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.is_file() or not entry.name.endswith(self.suffix) or '.tmp' in entry.name:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
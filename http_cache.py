@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from file_cache import FileCache, hash_key
+from rate_limit import RateLimitedRequestor
+
+MODES = ('off', 'cache', 'record', 'replay')
+
+# Headers that describe the live connection, not the content; never replayed
+_VOLATILE_HEADERS = ('x-ratelimit-remaining', 'x-ratelimit-reset', 'x-ratelimit-used',
+                     'set-cookie', 'content-encoding', 'content-length', 'transfer-encoding')
+
+# Served in replay mode instead of a real OAuth token exchange
+_REPLAY_TOKEN = {'access_token': 'replay', 'expires_in': 86400, 'scope': '*', 'token_type': 'bearer'}
+
+
+class ReplayMissError(Exception):
+    """A replay run asked for a response that was never recorded"""
+
+
+class ResponseCache:
+    """
+    On-disk store of Reddit API responses.
+
+    Modes:
+        off:    every request goes to Reddit
+        cache:  GET responses younger than `ttl` are served from disk; older
+                ones are revalidated with If-None-Match/If-Modified-Since
+                when Reddit sent validators, and refetched otherwise
+        record: every GET goes to Reddit and its response is stored
+        replay: only stored responses are served, whatever their age, and
+                no request (not even the OAuth token exchange) leaves the
+                machine; a request that was never recorded raises
+                ReplayMissError
+    """
+
+    def __init__(self, directory, mode='cache', ttl=300, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            directory (str): Directory holding the stored responses
+            mode (str): One of MODES
+            ttl (int): Seconds a cached response is served without asking Reddit (cache mode)
+            max_bytes (int): Byte budget for cache mode; recordings are never evicted
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown response cache mode: {mode}")
+        self.mode = mode
+        self.ttl = ttl
+        self.store = FileCache(directory, max_bytes if mode == 'cache' else None, suffix='.json')
+
+    @staticmethod
+    def key(method, url, params):
+        return hash_key(method.upper(), url, sorted((params or {}).items()))
+
+    def load(self, key):
+        path = self.store.get(key)
+        if not path:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def save(self, key, response):
+        self.save_parts(key, response.url, response.status_code, response.headers, response.text)
+
+    def save_parts(self, key, url, status, headers, body):
+        """Store a response given as its parts (for clients whose responses are not requests.Response)"""
+        entry = {
+            'url': url,
+            'status': status,
+            'headers': {
+                name: value for name, value in headers.items()
+                if name.lower() not in _VOLATILE_HEADERS
+            },
+            'body': body,
+            'stored_at': time.time(),
+        }
+        self._write(key, entry)
+
+    def touch(self, key, entry):
+        """Mark a revalidated entry as fresh again"""
+        entry['stored_at'] = time.time()
+        self._write(key, entry)
+
+    def _write(self, key, entry):
+        path = self.store.path_for(key)
+        tmp_path = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self.store.evict()
+
+    def is_fresh(self, entry):
+        return time.time() - entry['stored_at'] < self.ttl
+
+    @staticmethod
+    def validators(entry):
+        """Conditional request headers for a stored entry"""
+        headers = CaseInsensitiveDict(entry['headers'])
+        conditional = {}
+        if 'etag' in headers:
+            conditional['If-None-Match'] = headers['etag']
+        if 'last-modified' in headers:
+            conditional['If-Modified-Since'] = headers['last-modified']
+        return conditional
+
+    @staticmethod
+    def to_response(entry):
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.url = entry['url']
+        response.encoding = 'utf-8'
+        response._content = entry['body'].encode('utf-8')
+        return response
+
+
+class CachingRequestor(RateLimitedRequestor):
+    """Rate-limited prawcore requestor that serves and stores responses through a ResponseCache"""
+
+    def __init__(self, *args, response_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.response_cache = response_cache
+
+    def request(self, *args, **kwargs):
+        cache = self.response_cache
+        if cache is None or cache.mode == 'off':
+            return super().request(*args, **kwargs)
+
+        # prawcore passes method/url positionally for token requests and by keyword for API calls
+        args = list(args)
+        method = kwargs.pop('method', None) or args.pop(0)
+        url = kwargs.pop('url', None) or args.pop(0)
+
+        if cache.mode == 'replay':
+            if method.upper() == 'POST' and url.endswith('/api/v1/access_token'):
+                return cache.to_response({'status': 200, 'headers': {}, 'url': url,
+                                          'body': json.dumps(_REPLAY_TOKEN)})
+            entry = cache.load(cache.key(method, url, kwargs.get('params')))
+            if entry is None:
+                raise ReplayMissError(f"No recorded response for {method.upper()} {url} {kwargs.get('params')}")
+            return cache.to_response(entry)
+
+        # Only reads are cacheable
+        if method.upper() != 'GET':
+            return super().request(method, url, *args, **kwargs)
+
+        key = cache.key(method, url, kwargs.get('params'))
+        entry = cache.load(key) if cache.mode == 'cache' else None
+        if entry and cache.is_fresh(entry):
+            return cache.to_response(entry)
+
+        if entry:
+            conditional = cache.validators(entry)
+            if conditional:
+                kwargs['headers'] = {**(kwargs.get('headers') or {}), **conditional}
+
+        response = super().request(method, url, *args, **kwargs)
+        if entry and response.status_code == 304:
+            cache.touch(key, entry)
+            return cache.to_response(entry)
+        if response.status_code == 200:
+            cache.save(key, response)
+        return response
@@ -1,26 +1,28 @@
-import praw
-import pyttsx3
 import os
-import json
-import time
+import sys
 import random
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from moviepy.editor import *
+import json
 from datetime import datetime
 import dotenv
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
 import pickle
 import glob
 import logging
+import tempfile
+import threading
+
+# Heavy subsystems (praw, selenium, moviepy, googleapiclient, Pillow) are imported by
+# the stage that uses them, so short-lived commands only pay for what they run
+from background_library import BackgroundLibrary
+from browser_pool import BrowserPool
+from comment_selector import CommentSelector
+from daemon import VideoDaemon
+from ffmpeg_render import FFmpegRenderer, audio_duration
+from metrics import Instrumentation, instrumented, job_scoped
+from pipeline import StagePipeline
+from post_store import ProcessedPostStore
+from tts_pool import NarrationService
+from upload_spool import UploadSpool, UploadWorkerPool
+from youtube_upload import ResumableUploader
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -31,76 +33,248 @@ class RedditVideoGenerator:
     TOP_STORY_SUBREDDITS = [
         "AskReddit", "tifu", "relationships", "nosleep", "confession"
     ]
+    USER_AGENT = "script:RedditVideoBot:v1.0 (by /u/beast-fx2556)"
+    
+    # Post containers across Reddit layouts, best first, and generic last resorts
+    POST_SELECTORS = [
+        "[data-testid='post-content']", ".Post", "[data-click-id='text']", ".s1b7hvcc-0",
+        "div[data-test-id='post-content']"
+    ]
+    FALLBACK_POST_SELECTORS = ["article", "main", "body"]
+    PAGE_LOAD_TIMEOUT = 15
+    COMMENT_SELECTOR = "[data-testid='comment']"
+    
+    # Returns [index, element] for the first selector that matches, or null
+    SELECTOR_PROBE_SCRIPT = """
+        const selectors = arguments[0];
+        for (let i = 0; i < selectors.length; i++) {
+            const element = document.querySelector(selectors[i]);
+            if (element) return [i, element];
+        }
+        return null;
+    """
+    
+    # Returns [element, id, data-comment-id] for every comment element
+    COMMENT_INDEX_SCRIPT = """
+        return Array.from(document.querySelectorAll(arguments[0])).map(
+            element => [element, element.id, element.getAttribute('data-comment-id')]
+        );
+    """
 
-    def __init__(self, auto_upload=False):
-        # Initialize Reddit API with better error handling
-        if not my_client_id or not my_client_secret:
-            raise ValueError("Reddit API credentials not found. Please check your .env file.")
-        
-        try:
-            self.reddit = praw.Reddit(
-                client_id=my_client_id.strip(),
-                client_secret=my_client_secret.strip(),
-                user_agent="script:RedditVideoBot:v1.0 (by /u/beast-fx2556)"
-            )
-            # Test the connection
-            self.reddit.user.me()
-            print("✅ Successfully authenticated with Reddit API")
-        except Exception as e:
-            print(f"❌ Failed to initialize Reddit API: {e}")
-            print("Please verify your credentials in .env file and Reddit app settings")
-            raise
+    def __init__(self, auto_upload=False, tts_workers=2, tts_cache_mb=512, browsers=1, browser_max_pages=50,
+                 renderer='browser', render_engine='ffmpeg', async_reddit=True, verify_auth=True,
+                 reddit_cache='cache', upload_chunk_mb=8, upload_workers=2, metrics=True,
+                 render_workers=1, segment_cache_mb=1024, background_size=None):
+        # Reddit clients, created by connect_reddit when a fetch stage first needs them
+        self.reddit = None
+        self.rate_limiter = None
+        self.response_cache = None
+        self.async_fetcher = None
+        self.candidates = None
+        # Reddit responses: 'cache' reuses fresh ones, 'record' stores every one, 'replay' serves only recorded ones
+        self.reddit_cache_dir = "reddit_cache"
+        self.reddit_recordings_dir = "reddit_recordings"
+        self.reddit_cache = reddit_cache
+        self.async_reddit = async_reddit
+        self.verify_auth = verify_auth
+        self.reddit_lock = threading.Lock()
         
         # Create directories
         self.audio_dir = "audio"
         self.screenshots_dir = "screenshots"
         self.videos_dir = "videos"
         self.background_dir = "background_videos"
+        self.tts_cache_dir = "audio_cache"
+        self.background_cache_dir = "background_cache"
+        self.segment_cache_dir = "segment_cache"
+        # Background and offset picked for each post, so a re-render lines up with its cached segments
+        self.render_plans_dir = "render_plans"
         
         for directory in [self.audio_dir, self.screenshots_dir, self.videos_dir, self.background_dir]:
             os.makedirs(directory, exist_ok=True)
         
         # Load processed posts
         self.processed_posts_file = "processed_posts.json"
+        self.processed_posts_db = "processed_posts.db"
         self.processed_posts = self.load_processed_posts()
+        # Posts picked by a job that is still in flight (batch mode)
+        self.reserved_posts = set()
+        self.reserved_lock = threading.Lock()
+        
+        # Filtered hot posts from every story subreddit, cached across runs
+        self.candidates_file = "candidate_posts.json"
+        self.comment_selector = CommentSelector()
+        
+        # Job manifests written by the stage commands (fetch/narrate/render/upload)
+        self.jobs_dir = "jobs"
+        
+        # Long-lived TTS workers, started on first use, with a disk cache of finished clips
+        self.narration = NarrationService(
+            workers=tts_workers,
+            cache_dir=self.tts_cache_dir if tts_cache_mb > 0 else None,
+            cache_max_bytes=tts_cache_mb * 1024 * 1024
+        )
+        
+        # Headless browsers kept alive across screenshot jobs
+        self.browser_pool = BrowserPool(self.setup_browser, size=browsers, max_pages=browser_max_pages)
+        self.last_post_selector = None
+        # Post permalinks are screenshotted under this site
+        self.reddit_base_url = "https://reddit.com"
+        
+        # 'browser' screenshots reddit.com, 'cards' draws the post/comments offline
+        self.renderer = renderer
+        self.card_renderer = None
+        
+        # 'ffmpeg' renders in a single ffmpeg process, 'segmented' renders each card on its own
+        # (up to render_workers at once) and joins them, 'moviepy' composites in Python
+        self.render_engine = render_engine
+        self.render_workers = render_workers
+        self.ffmpeg_renderer = FFmpegRenderer(
+            cache_dir=self.segment_cache_dir if segment_cache_mb > 0 else None,
+            cache_max_bytes=segment_cache_mb * 1024 * 1024
+        )
+        
+        # Backgrounds are transcoded once to the output profile and reused
+        # Each source keeps its aspect ratio, capped at 1080 lines, unless background_size=(width, height) is given
+        width, height = background_size or (None, None)
+        self.background_library = BackgroundLibrary(self.background_dir, self.background_cache_dir, width, height)
         
         # YouTube API settings
         self.SCOPES = ['https://www.googleapis.com/auth/youtube.upload']
         self.API_SERVICE_NAME = 'youtube'
         self.API_VERSION = 'v3'
         self.CLIENT_SECRETS_FILE = 'client_secret.json'
-        self.youtube = None
+        self.youtube_credentials = None
+        # The API client is not thread-safe; each upload worker builds its own
+        self.youtube_local = threading.local()
+        self.youtube_lock = threading.Lock()
         self.auto_upload = auto_upload
+        # Chunked uploads whose session survives a restart
+        self.upload_sessions_dir = "upload_sessions"
+        self.uploader = ResumableUploader(self.upload_sessions_dir, chunk_size=upload_chunk_mb * 1024 * 1024)
+        # Finished videos wait in a spool that background workers upload from
+        self.upload_spool_dir = "upload_spool"
+        self.upload_spool = UploadSpool(self.upload_spool_dir)
+        self.upload_pool = UploadWorkerPool(
+            self.upload_spool, self.upload_spooled, workers=upload_workers, on_done=self.record_upload
+        )
+        # Per-stage timings and resource use: spans.jsonl per run, reddit_video.prom for Prometheus
+        self.metrics_dir = "metrics"
+        self.metrics = Instrumentation(self.metrics_dir, enabled=metrics)
         logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
     
+    def connect_reddit(self):
+        """
+        Create the Reddit clients, rate limiter, response cache and candidate queue (once).
+        
+        Called at the start of every stage that talks to Reddit, so only those stages
+        pay for praw and a missing or bad credential fails right there.
+        """
+        with self.reddit_lock:
+            if self.reddit is not None:
+                return self.reddit
+            
+            import praw
+            from async_reddit import AsyncRedditFetcher, asyncpraw_available
+            from candidate_queue import CandidateQueue
+            from http_cache import CachingRequestor, ResponseCache
+            from rate_limit import RateLimiter
+            
+            response_cache = None
+            if self.reddit_cache != 'off':
+                response_cache = ResponseCache(
+                    self.reddit_cache_dir if self.reddit_cache == 'cache' else self.reddit_recordings_dir,
+                    mode=self.reddit_cache
+                )
+            
+            # Initialize Reddit API with better error handling (a replay never talks to Reddit)
+            client_id, client_secret = my_client_id, my_client_secret
+            verify_auth = self.verify_auth
+            if self.reddit_cache == 'replay':
+                client_id, client_secret = client_id or "replay", client_secret or "replay"
+                verify_auth = False
+            if not client_id or not client_secret:
+                raise ValueError("Reddit API credentials not found. Please check your .env file.")
+            client_id, client_secret = client_id.strip(), client_secret.strip()
+            
+            # One request budget for every generator process on this host
+            rate_limiter = RateLimiter(os.path.join(tempfile.gettempdir(), "reddit_rate_limit.json"))
+            
+            try:
+                reddit = praw.Reddit(
+                    client_id=client_id,
+                    client_secret=client_secret,
+                    user_agent=self.USER_AGENT,
+                    requestor_class=CachingRequestor,
+                    requestor_kwargs={'rate_limiter': rate_limiter, 'response_cache': response_cache}
+                )
+                # Test the connection (batch runs skip this round-trip; their first fetch checks the credentials)
+                if verify_auth:
+                    reddit.user.me()
+                    print("✅ Successfully authenticated with Reddit API")
+            except Exception as e:
+                print(f"❌ Failed to initialize Reddit API: {e}")
+                print("Please verify your credentials in .env file and Reddit app settings")
+                raise
+            
+            # Concurrent listing/comment fetches over one session, when asyncpraw is installed.
+            # It shares the response cache in 'cache' mode; recording and replaying need every
+            # request to go through the sync client's cache.
+            async_fetcher = None
+            if self.async_reddit and asyncpraw_available() and self.reddit_cache not in ('record', 'replay'):
+                async_fetcher = AsyncRedditFetcher(
+                    client_id, client_secret, self.USER_AGENT,
+                    rate_limiter=rate_limiter, response_cache=response_cache
+                )
+            
+            candidates = CandidateQueue(
+                reddit, self.TOP_STORY_SUBREDDITS, self.candidates_file,
+                is_taken=lambda post_id: post_id in self.processed_posts or post_id in self.reserved_posts,
+                async_fetcher=async_fetcher
+            )
+            
+            self.response_cache = response_cache
+            self.rate_limiter = rate_limiter
+            self.async_fetcher = async_fetcher
+            self.candidates = candidates
+            # Set last: its presence marks the clients as ready
+            self.reddit = reddit
+            return reddit
+    
     def load_processed_posts(self):
-        """Load processed posts from JSON file, handling empty or corrupted files"""
-        try:
-            if os.path.exists(self.processed_posts_file):
-                with open(self.processed_posts_file, 'r') as f:
-                    content = f.read().strip()
-                    if content:  # Check if file is not empty
-                        return set(json.loads(content))
-                    else:
-                        print("Warning: processed_posts.json is empty. Creating new set.")
-                        return set()
-            else:
-                print("processed_posts.json not found. Creating new set.")
-                return set()
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            print(f"Error loading processed posts: {e}. Creating new set.")
-            return set()
-    
-    def save_processed_posts(self):
-        """Save processed posts to JSON file"""
-        try:
-            with open(self.processed_posts_file, 'w') as f:
-                json.dump(list(self.processed_posts), f, indent=2)
-        except Exception as e:
-            print(f"Error saving processed posts: {e}")
+        """Open the processed-post store, importing the old JSON history on first use"""
+        return ProcessedPostStore(self.processed_posts_db, legacy_json_path=self.processed_posts_file)
     
     def authenticate_youtube(self):
         """Authenticate with YouTube API"""
+        with self.youtube_lock:
+            if not self.youtube_credentials:
+                self.youtube_credentials = self.load_youtube_credentials()
+        return self.get_youtube()
+    
+    def get_card_renderer(self):
+        """Offline card renderer, created on first use so only the stages that draw cards load Pillow"""
+        if self.card_renderer is None:
+            from card_renderer import CardRenderer
+            self.card_renderer = CardRenderer(self.screenshots_dir)
+        return self.card_renderer
+    
+    def get_youtube(self):
+        """YouTube API service for the calling thread"""
+        if not self.youtube_credentials:
+            return self.authenticate_youtube()
+        youtube = getattr(self.youtube_local, 'service', None)
+        if youtube is None:
+            from googleapiclient.discovery import build
+            youtube = build(self.API_SERVICE_NAME, self.API_VERSION, credentials=self.youtube_credentials)
+            self.youtube_local.service = youtube
+        return youtube
+    
+    def load_youtube_credentials(self):
+        """Load, refresh or obtain YouTube OAuth credentials"""
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        
         credentials = None
         
         # Load existing credentials
@@ -135,8 +309,7 @@ class RedditVideoGenerator:
             except Exception as e:
                 print(f"Error saving credentials: {e}")
         
-        self.youtube = build(self.API_SERVICE_NAME, self.API_VERSION, credentials=credentials)
-        return self.youtube
+        return credentials
     
     def generate_video_metadata(self, post_data, comments_data):
         """Generate YouTube video metadata"""
@@ -174,16 +347,17 @@ Original Post: {post_data['title']}
         
         return title, description, tags
     
-    def upload_to_youtube(self, video_path, post_data, comments_data):
-        """Upload video to YouTube"""
+    @instrumented('upload_to_youtube')
+    def upload_to_youtube(self, video_path, post_data, comments_data, thumbnail_path=None, on_progress=None,
+                          guess_thumbnail=True):
+        """Upload video to YouTube (guess_thumbnail: without thumbnail_path, use any post screenshot)"""
         print("Uploading video to YouTube...")
         
-        if not self.youtube:
-            try:
-                self.authenticate_youtube()
-            except Exception as e:
-                print(f"YouTube authentication failed: {e}")
-                return None
+        try:
+            youtube = self.get_youtube()
+        except Exception as e:
+            print(f"YouTube authentication failed: {e}")
+            return None
         
         title, description, tags = self.generate_video_metadata(post_data, comments_data)
         
@@ -203,38 +377,7 @@ Original Post: {post_data['title']}
         }
         
         try:
-            media = MediaFileUpload(video_path, chunksize=-1, resumable=True, mimetype='video/*')
-            
-            insert_request = self.youtube.videos().insert(
-                part=','.join(body.keys()),
-                body=body,
-                media_body=media
-            )
-            
-            response = None
-            error = None
-            retry = 0
-            
-            while response is None:
-                try:
-                    print(f"Uploading file... Attempt {retry + 1}")
-                    status, response = insert_request.next_chunk()
-                    if status:
-                        print(f"Upload progress: {int(status.progress() * 100)}%")
-                except HttpError as e:
-                    if e.resp.status in [500, 502, 503, 504]:
-                        error = f"Server error: {e}"
-                        retry += 1
-                        if retry > 5:
-                            print(f"Upload failed after 5 retries: {error}")
-                            return None
-                        time.sleep(2 ** retry)
-                    else:
-                        print(f"HTTP Error: {e}")
-                        return None
-                except Exception as e:
-                    print(f"Upload error: {e}")
-                    return None
+            response = self.uploader.upload(youtube, video_path, body, on_progress=on_progress)
             
             if response is not None:
                 if 'id' in response:
@@ -244,7 +387,7 @@ Original Post: {post_data['title']}
                     print(f"🔗 Video URL: {video_url}")
                     print(f"📺 Video ID: {video_id}")
                     
-                    self.add_thumbnail_if_available(video_id)
+                    self.add_thumbnail_if_available(video_id, thumbnail_path, guess=guess_thumbnail)
                     
                     return {
                         'video_id': video_id,
@@ -259,14 +402,20 @@ Original Post: {post_data['title']}
             print(f"Unexpected error during upload: {e}")
             return None
     
-    def add_thumbnail_if_available(self, video_id):
+    def add_thumbnail_if_available(self, video_id, thumbnail_path=None, guess=True):
         """Add thumbnail to YouTube video if available"""
-        thumbnail_path = os.path.join(self.screenshots_dir, "post_*.png")
-        thumbnails = glob.glob(thumbnail_path)
+        if thumbnail_path:
+            thumbnails = [thumbnail_path] if os.path.exists(thumbnail_path) else []
+        elif guess:
+            # Legacy direct uploads only: whatever post screenshot is lying around
+            thumbnails = glob.glob(os.path.join(self.screenshots_dir, "post_*.png"))
+        else:
+            thumbnails = []
         
-        if thumbnails and self.youtube:
+        if thumbnails:
+            from googleapiclient.http import MediaFileUpload
             try:
-                self.youtube.thumbnails().set(
+                self.get_youtube().thumbnails().set(
                     videoId=video_id,
                     media_body=MediaFileUpload(thumbnails[0])
                 ).execute()
@@ -274,68 +423,41 @@ Original Post: {post_data['title']}
             except Exception as e:
                 print(f"Failed to upload thumbnail: {e}")
     
-    def get_reddit_post(self, subreddit_name=None, limit=10):
-        """Get a suitable Reddit post"""
-        if subreddit_name is None:
-            subreddit_name = random.choice(self.TOP_STORY_SUBREDDITS)
-        print(f"Fetching posts from r/{subreddit_name}...")
-        
+    @instrumented('get_reddit_post')
+    def get_reddit_post(self, subreddit_name=None):
+        """Get a suitable Reddit post from the prefetched candidate queue"""
         try:
-            subreddit = self.reddit.subreddit(subreddit_name)
-            
-            for submission in subreddit.hot(limit=limit):
-                if submission.id in self.processed_posts:
-                    continue
-                
-                if submission.over_18:
-                    continue
-                
-                if not submission.selftext and not submission.title:
-                    continue
-                
-                # Skip posts that are too short
-                if len(submission.title) < 10:
-                    continue
-                
-                print(f"Selected post: {submission.title[:50]}...")
-                submission.subreddit_name = subreddit_name
-                return submission
+            self.connect_reddit()
+            submission = self.candidates.next(subreddit_name)
+            if not submission:
+                print("No suitable posts found!")
+                return None
+            # Must be set before the submission is first loaded
+            submission.comment_sort = self.comment_selector.comment_sort
             
-            print("No suitable posts found!")
-            return None
+            print(f"Selected post: {submission.title[:50]}...")
+            return submission
             
         except Exception as e:
             print(f"Error fetching Reddit posts: {e}")
             return None
     
+    @instrumented('get_comments')
     def get_comments(self, submission, max_comments=5, max_words=100):
-        """Get suitable comments from a Reddit post"""
+        """Get the best suitable comments from a Reddit post"""
         print("Fetching comments...")
+        from rate_limit import HIGH
         
         try:
-            submission.comments.replace_more(limit=0)
-            
-            selected_comments = []
-            
-            for comment in submission.comments:
-                if not hasattr(comment, 'body') or comment.body in ['[deleted]', '[removed]']:
-                    continue
-                
-                word_count = len(comment.body.split())
-                if word_count > max_words or word_count < 5:
-                    continue
-                
-                selected_comments.append({
-                    'id': comment.id,
-                    'body': comment.body,
-                    'score': comment.score
-                })
-                
-                if len(selected_comments) >= max_comments:
-                    break
+            self.connect_reddit()
+            selector = self.comment_selector
+            if (max_comments, max_words) != (selector.max_comments, selector.max_words):
+                selector = CommentSelector(max_comments=max_comments, max_words=max_words,
+                                           request_budget=selector.request_budget)
             
-            # Sort by score (upvotes)
-            selected_comments.sort(key=lambda x: x['score'], reverse=True)
+            # We are committed to this post; its comments go ahead of listing prefetches
+            with self.rate_limiter.priority(HIGH):
+                selected_comments = selector.select(submission)
             print(f"Selected {len(selected_comments)} comments")
             
             return selected_comments
@@ -344,46 +466,31 @@ Original Post: {post_data['title']}
             print(f"Error fetching comments: {e}")
             return []
     
+    @instrumented('text_to_speech')
     def text_to_speech(self, text, filename):
         """Convert text to speech"""
         print(f"Generating TTS for: {filename}")
         
-        try:
-            engine = pyttsx3.init()
-            
-            # Configure TTS settings
-            engine.setProperty('rate', 165)
-            engine.setProperty('volume', 1.0)
-            
-            voices = engine.getProperty('voices')
-            # Prefer female/en voices, else randomize
-            preferred_voices = [v for v in voices if ('en' in v.languages[0] if hasattr(v, 'languages') and v.languages else 'en' in v.id) and ('female' in v.name.lower() or 'zira' in v.id.lower() or 'susan' in v.id.lower())]
-            if not preferred_voices:
-                preferred_voices = [v for v in voices if 'en' in (v.languages[0] if hasattr(v, 'languages') and v.languages else v.id)]
-            if preferred_voices:
-                chosen_voice = random.choice(preferred_voices)
-                engine.setProperty('voice', chosen_voice.id)
-            elif voices:
-                engine.setProperty('voice', random.choice(voices).id)
-            
-            filepath = os.path.join(self.audio_dir, f"{filename}.wav")
-            engine.save_to_file(text, filepath)
-            engine.runAndWait()
-            
-            # Verify file was created
-            if os.path.exists(filepath):
-                return filepath
-            else:
-                print(f"Error: Audio file not created for {filename}")
-                return None
-                
-        except Exception as e:
-            print(f"Error generating TTS for {filename}: {e}")
-            return None
+        filepath = os.path.join(self.audio_dir, f"{filename}.wav")
+        return self.narration.synthesize(text, filepath)
+    
+    @instrumented('text_to_speech')
+    def text_to_speech_many(self, clips):
+        """Convert several texts to speech in parallel; clips maps key -> (text, filename)"""
+        for _, filename in clips.values():
+            print(f"Generating TTS for: {filename}")
+        
+        return self.narration.synthesize_many({
+            key: (text, os.path.join(self.audio_dir, f"{filename}.wav"))
+            for key, (text, filename) in clips.items()
+        })
     
+    @instrumented('setup_browser')
     def setup_browser(self):
         """Setup Firefox browser with options"""
         print("Setting up browser...")
+        from selenium import webdriver
+        from selenium.webdriver.firefox.options import Options
         
         try:
             options = Options()
@@ -400,32 +507,71 @@ Original Post: {post_data['title']}
             print(f"Error setting up browser: {e}")
             raise
     
+    def find_post_element(self, driver, timeout=None):
+        """Wait for the post element, probing every candidate selector at once"""
+        if timeout is None:
+            timeout = self.PAGE_LOAD_TIMEOUT
+        
+        # Try the selector that matched last time first
+        selectors = list(self.POST_SELECTORS)
+        if self.last_post_selector in selectors:
+            selectors.remove(self.last_post_selector)
+            selectors.insert(0, self.last_post_selector)
+        
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+        
+        def probe(candidates):
+            found = driver.execute_script(self.SELECTOR_PROBE_SCRIPT, candidates)
+            return (candidates[found[0]], found[1]) if found else None
+        
+        try:
+            selector, element = WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+                lambda d: probe(selectors) or False
+            )
+            self.last_post_selector = selector
+            return element
+        except TimeoutException:
+            # Page never showed a post container; settle for a generic one
+            found = probe(self.FALLBACK_POST_SELECTORS)
+            return found[1] if found else None
+    
+    def index_comment_elements(self, driver, comment_ids):
+        """
+        Map comment ids to their elements with a single WebDriver round-trip.
+        
+        Returns:
+            tuple: (all comment elements in page order, dict of comment id -> element)
+        """
+        rows = driver.execute_script(self.COMMENT_INDEX_SCRIPT, self.COMMENT_SELECTOR)
+        elements = [row[0] for row in rows]
+        
+        index = {}
+        for elem, elem_id, data_comment_id in rows:
+            # Match by data-comment-id attribute or by id suffix (e.g. "t1_<id>")
+            if data_comment_id in comment_ids and data_comment_id not in index:
+                index[data_comment_id] = elem
+            if elem_id:
+                for comment_id in comment_ids:
+                    if comment_id not in index and elem_id.endswith(comment_id):
+                        index[comment_id] = elem
+        return elements, index
+    
+    @instrumented('take_screenshot')
     def take_screenshot(self, driver, url, post_id, comment_ids=None):
         """Take screenshots of Reddit post and comments"""
         print(f"Taking screenshots for post: {post_id}")
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
         
         screenshots = {}
         
         try:
             driver.get(url)
-            time.sleep(5)  # Wait for page to load
             
             # Robust post screenshot
-            post_selectors = [
-                "[data-testid='post-content']", ".Post", "[data-click-id='text']", ".s1b7hvcc-0",
-                "div[data-test-id='post-content']", "article", "main", "body"
-            ]
-            
-            post_element = None
-            for selector in post_selectors:
-                try:
-                    post_element = WebDriverWait(driver, 8).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                    )
-                    if post_element:
-                        break
-                except TimeoutException:
-                    continue
+            post_element = self.find_post_element(driver)
             
             if post_element:
                 post_filename = f"post_{post_id}.png"
@@ -447,24 +593,18 @@ Original Post: {post_data['title']}
             if comment_ids:
                 # Wait for at least one comment to be present
                 WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "[data-testid='comment']"))
+                    EC.presence_of_element_located((By.CSS_SELECTOR, self.COMMENT_SELECTOR))
                 )
-                all_comment_elements = driver.find_elements(By.CSS_SELECTOR, "[data-testid='comment']")
+                all_comment_elements, comment_index = self.index_comment_elements(driver, comment_ids)
                 for i, comment_id in enumerate(comment_ids):
-                    found = False
-                    for elem in all_comment_elements:
-                        # Try to match by id or data-comment-id attribute
-                        elem_id = elem.get_attribute("id")
-                        data_comment_id = elem.get_attribute("data-comment-id")
-                        if (elem_id and elem_id.endswith(comment_id)) or (data_comment_id == comment_id):
-                            comment_filename = f"comment_{comment_id}.png"
-                            comment_path = os.path.join(self.screenshots_dir, comment_filename)
-                            elem.screenshot(comment_path)
-                            screenshots[f'comment_{i}'] = comment_path
-                            print(f"Comment screenshot saved: {comment_filename}")
-                            found = True
-                            break
-                    if not found:
+                    elem = comment_index.get(comment_id)
+                    if elem is not None:
+                        comment_filename = f"comment_{comment_id}.png"
+                        comment_path = os.path.join(self.screenshots_dir, comment_filename)
+                        elem.screenshot(comment_path)
+                        screenshots[f'comment_{i}'] = comment_path
+                        print(f"Comment screenshot saved: {comment_filename}")
+                    else:
                         print(f"Could not find comment element for {comment_id}, falling back to first available comment block.")
                         # Fallback: screenshot the i-th comment block if available
                         if i < len(all_comment_elements):
@@ -486,34 +626,131 @@ Original Post: {post_data['title']}
         
         return screenshots
     
-    def create_video(self, post_data, comments_data, screenshots, audio_files):
+    def collect_segments(self, comments_data, screenshots, audio_files):
+        """Pair each screenshot with its narration, in playback order"""
+        keys = ['post'] + [f'comment_{i}' for i in range(len(comments_data))]
+        return [
+            (screenshots[key], audio_files[key])
+            for key in keys
+            if key in screenshots and audio_files.get(key)
+        ]
+    
+    def choose_background(self):
+        """Pick a random background video (its prepared copy), or None if there are none"""
+        try:
+            return self.background_library.choose()
+        except Exception as e:
+            print(f"Error preparing background: {e}. Using the original file.")
+            background_files = [f for f in os.listdir(self.background_dir) if f.endswith('.mp4')]
+            if not background_files:
+                return None
+            return os.path.join(self.background_dir, random.choice(background_files))
+    
+    def load_render_plan(self, post_id):
+        try:
+            with open(os.path.join(self.render_plans_dir, f"{post_id}.json"), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+    
+    def save_render_plan(self, post_id, plan):
+        os.makedirs(self.render_plans_dir, exist_ok=True)
+        path = os.path.join(self.render_plans_dir, f"{post_id}.json")
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(plan, f)
+        os.replace(tmp_path, path)
+    
+    def plan_background(self, post_id, segments):
+        """
+        Background, start offset and per-segment offsets for a post's video.
+        
+        The first render picks the background and offset at random; re-renders
+        of the same post reuse that choice, and each segment rendered before
+        keeps its own slice (segment id -> offset), so unchanged segments match
+        their cached renders even when the ones before them changed length.
+        
+        Returns:
+            tuple: (background path or None, offset in seconds, segment offsets)
+        """
+        plan = self.load_render_plan(post_id)
+        if plan and plan.get('background') and os.path.exists(plan['background']):
+            return plan['background'], plan['offset'], plan.get('segments', {})
+        
+        background_path = self.choose_background()
+        if not background_path:
+            return None, 0, {}
+        duration = sum(audio_duration(audio_path) for _, audio_path in segments)
+        background_offset = self.background_library.pick_offset(background_path, duration)
+        try:
+            self.save_render_plan(post_id, {'background': background_path, 'offset': background_offset})
+        except OSError as e:
+            print(f"Error saving render plan: {e}")
+        return background_path, background_offset, {}
+    
+    @instrumented('create_video')
+    def create_video(self, post_data, comments_data, screenshots, audio_files, engine=None):
         """Create video from screenshots and audio"""
         print("Creating video...")
         
+        if engine is None:
+            engine = self.render_engine
+        
+        segments = self.collect_segments(comments_data, screenshots, audio_files)
+        if not segments:
+            print("No clips to process!")
+            return None
+        
+        background_path, background_offset, segment_offsets = self.plan_background(post_data['id'], segments)
+        if not background_path:
+            print("No background videos found, using main video only")
+        
+        # Generate output filename
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = f"reddit_video_{post_data['id']}_{timestamp}.mp4"
+        output_path = os.path.join(self.videos_dir, output_filename)
+        
+        if engine in ('ffmpeg', 'segmented'):
+            try:
+                if engine == 'segmented':
+                    try:
+                        self.ffmpeg_renderer.render_segmented(
+                            segments, output_path, background_path, background_offset,
+                            workers=self.render_workers, offsets=segment_offsets
+                        )
+                    finally:
+                        # Kept even when the render fails, so the segments it finished stay cache hits
+                        if background_path:
+                            try:
+                                self.save_render_plan(post_data['id'], {
+                                    'background': background_path, 'offset': background_offset,
+                                    'segments': segment_offsets
+                                })
+                            except OSError as e:
+                                print(f"Error saving render plan: {e}")
+                else:
+                    self.ffmpeg_renderer.render(segments, output_path, background_path, background_offset)
+                print(f"Video saved: {output_path}")
+                return output_path
+            except Exception as e:
+                print(f"ffmpeg render failed: {e}. Falling back to moviepy.")
+        
+        return self.create_video_moviepy(segments, output_path, background_path, background_offset)
+    
+    def create_video_moviepy(self, segments, output_path, background_path=None, background_offset=0):
+        """Composite the video frame by frame with moviepy"""
+        from moviepy.editor import AudioFileClip, CompositeVideoClip, ImageClip, VideoFileClip, concatenate_videoclips
+        
         clips = []
         
         try:
-            # Add post clip
-            if 'post' in screenshots and 'post' in audio_files and audio_files['post']:
+            for image_path, audio_path in segments:
                 try:
-                    post_audio = AudioFileClip(audio_files['post'])
-                    post_img = ImageClip(screenshots['post']).set_duration(post_audio.duration)
-                    post_clip = post_img.set_audio(post_audio)
-                    clips.append(post_clip)
+                    audio = AudioFileClip(audio_path)
+                    img = ImageClip(image_path).set_duration(audio.duration)
+                    clips.append(img.set_audio(audio))
                 except Exception as e:
-                    print(f"Error creating post clip: {e}")
-            
-            # Add comment clips
-            for i, comment in enumerate(comments_data):
-                comment_key = f'comment_{i}'
-                if comment_key in screenshots and comment_key in audio_files and audio_files[comment_key]:
-                    try:
-                        comment_audio = AudioFileClip(audio_files[comment_key])
-                        comment_img = ImageClip(screenshots[comment_key]).set_duration(comment_audio.duration)
-                        comment_clip = comment_img.set_audio(comment_audio)
-                        clips.append(comment_clip)
-                    except Exception as e:
-                        print(f"Error creating comment clip {i}: {e}")
+                    print(f"Error creating clip for {os.path.basename(image_path)}: {e}")
             
             if not clips:
                 print("No clips to process!")
@@ -523,12 +760,7 @@ Original Post: {post_data['title']}
             main_video = concatenate_videoclips(clips, method="compose")
             
             # Add background video if available
-            background_files = [f for f in os.listdir(self.background_dir) if f.endswith('.mp4')]
-            
-            if background_files:
-                background_file = random.choice(background_files)
-                background_path = os.path.join(self.background_dir, background_file)
-                
+            if background_path:
                 try:
                     background = VideoFileClip(background_path)
                     
@@ -536,7 +768,8 @@ Original Post: {post_data['title']}
                     if background.duration < main_video.duration:
                         background = background.loop(duration=main_video.duration)
                     else:
-                        background = background.subclip(0, main_video.duration)
+                        start = background_offset if background_offset + main_video.duration <= background.duration else 0
+                        background = background.subclip(start, start + main_video.duration)
                     
                     # Resize main video and overlay on background
                     main_video_resized = main_video.resize(height=background.h//2).set_position(('center', 'center'))
@@ -548,13 +781,12 @@ Original Post: {post_data['title']}
                     print(f"Error adding background: {e}")
                     final_video = main_video
             else:
-                print("No background videos found, using main video only")
                 final_video = main_video
             
-            # Generate output filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_filename = f"reddit_video_{post_data['id']}_{timestamp}.mp4"
-            output_path = os.path.join(self.videos_dir, output_filename)
+            # Cards without a background never change within a segment
+            ffmpeg_params = None
+            if final_video is main_video and self.ffmpeg_renderer.still_image:
+                ffmpeg_params = ['-tune', 'stillimage', '-g', str(24 * self.ffmpeg_renderer.keyframe_seconds)]
             
             # Write video file
             final_video.write_videofile(
@@ -562,6 +794,7 @@ Original Post: {post_data['title']}
                 fps=24,
                 codec='libx264',
                 audio_codec='aac',
+                ffmpeg_params=ffmpeg_params,
                 verbose=False,
                 logger=None
             )
@@ -579,9 +812,16 @@ Original Post: {post_data['title']}
             print(f"Error creating video: {e}")
             return None
     
-    def cleanup_temp_files(self):
-        """Clean up temporary files"""
+    def cleanup_temp_files(self, paths=None):
+        """Clean up temporary files, or only the given paths when a job list is passed"""
         try:
+            if paths is not None:
+                for path in paths:
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                print("Temporary files cleaned up")
+                return
+
             # Clean up audio files
             for file in os.listdir(self.audio_dir):
                 if file.endswith('.wav'):
@@ -596,102 +836,198 @@ Original Post: {post_data['title']}
         except Exception as e:
             print(f"Error cleaning up temporary files: {e}")
     
-    def generate_and_upload_video(self, subreddit=None, auto_upload=None):
-        """Main method to generate and optionally upload video"""
-        print("Starting video generation...")
+    def close(self):
+        """Release long-lived resources (upload workers, TTS workers, browsers, post store)"""
+        self.upload_pool.close(timeout=5)
+        self.narration.close()
+        self.browser_pool.close()
+        self.processed_posts.close()
+    
+    def fetch_job(self, subreddit=None):
+        """Fetch a post and its comments; returns a job dict or None"""
+        self.connect_reddit()
+        # Get Reddit post (from any story subreddit unless one was given)
+        submission = self.get_reddit_post(subreddit)
+        if not submission:
+            return None
+        with self.reserved_lock:
+            self.reserved_posts.add(submission.id)
         
-        if subreddit is None:
-            subreddit = random.choice(self.TOP_STORY_SUBREDDITS)
-        if auto_upload is None:
-            auto_upload = self.auto_upload
+        # Get comments
+        with self.metrics.job(submission.id):
+            comments = self.get_comments(submission)
+        return self.build_job(submission, comments, subreddit)
+    
+    def fetch_jobs(self, count, subreddit=None):
+        """
+        Fetch up to `count` posts, loading their comments concurrently when the async client is available.
+        
+        Without it, only one post is fetched per call.
+        
+        Returns:
+            tuple: (jobs, number of posts tried, at least 1) for the caller's attempt budget
+        """
+        self.connect_reddit()
+        if not self.async_fetcher or count < 2:
+            job = self.fetch_job(subreddit)
+            return ([job] if job else []), 1
         
+        candidates = []
+        for _ in range(count):
+            candidate = self.candidates.next_candidate(subreddit)
+            if not candidate:
+                break
+            with self.reserved_lock:
+                self.reserved_posts.add(candidate['id'])
+            candidates.append(candidate)
+        if not candidates:
+            print("No suitable posts found!")
+            return [], 1
+        
+        print(f"Fetching {len(candidates)} posts and their comments concurrently...")
+        from rate_limit import HIGH
         try:
-            # Get Reddit post
-            submission = self.get_reddit_post(subreddit)
-            if not submission:
-                return None
-            
-            # Get comments
-            comments = self.get_comments(submission)
-            if not comments:
-                print("No suitable comments found!")
-                return None
-            
-            # Generate audio files
-            audio_files = {}
-            
-            # Generate TTS for post
-            post_text = f"{submission.title}. {submission.selftext}" if submission.selftext else submission.title
-            audio_files['post'] = self.text_to_speech(post_text, f"post_{submission.id}")
-            
-            # Generate TTS for comments
-            for i, comment in enumerate(comments):
-                audio_file = self.text_to_speech(
-                    comment['body'], 
-                    f"comment_{comment['id']}"
-                )
-                if audio_file:
-                    audio_files[f'comment_{i}'] = audio_file
-            
-            # Take screenshots
-            driver = None
+            with self.rate_limiter.priority(HIGH), self.metrics.span('fetch_posts'):
+                fetched = self.async_fetcher.fetch_posts([c['id'] for c in candidates], self.comment_selector)
+        except Exception as e:
+            print(f"Error fetching posts: {e}")
+            return [], len(candidates)
+        
+        jobs = []
+        for candidate in candidates:
+            outcome = fetched[candidate['id']]
+            if isinstance(outcome, Exception):
+                print(f"Error fetching post {candidate['id']}: {outcome}")
+                continue
+            submission, comments = outcome
+            submission.subreddit_name = candidate['subreddit']
+            print(f"Selected post: {submission.title[:50]}...")
+            job = self.build_job(submission, comments, subreddit)
+            if job:
+                jobs.append(job)
+        return jobs, len(candidates)
+    
+    def build_job(self, submission, comments, subreddit=None):
+        """Build a job dict from a fetched post and its selected comments"""
+        if not comments:
+            print("No suitable comments found!")
+            return None
+        
+        # Prepare post data
+        post_data = {
+            'id': submission.id,
+            'title': submission.title,
+            'text': submission.selftext,
+            'url': submission.permalink,
+            'subreddit': getattr(submission, 'subreddit_name', subreddit),
+            'author': str(submission.author) if submission.author else '[deleted]',
+            'score': submission.score
+        }
+        
+        return {
+            'post_data': post_data,
+            'comments_data': comments
+        }
+    
+    @job_scoped
+    def narrate_job(self, job):
+        """Generate the narration of a job's post and comments (in parallel)"""
+        post_data = job['post_data']
+        post_text = f"{post_data['title']}. {post_data['text']}" if post_data['text'] else post_data['title']
+        clips = {'post': (post_text, f"post_{post_data['id']}")}
+        for i, comment in enumerate(job['comments_data']):
+            clips[f'comment_{i}'] = (comment['body'], f"comment_{comment['id']}")
+        
+        job['audio_files'] = {
+            key: path for key, path in self.text_to_speech_many(clips).items()
+            if path or key == 'post'
+        }
+        return job
+    
+    @job_scoped
+    def capture_job(self, job):
+        """Screenshot (or draw) the post and comment cards of a job"""
+        post_data = job['post_data']
+        comments = job['comments_data']
+        
+        if job.get('renderer', self.renderer) == 'cards':
+            # Draw the cards from the fetched data, no browser needed
+            with self.metrics.span('render_cards') as span:
+                screenshots = self.get_card_renderer().render(post_data, comments)
+                span.add_files(screenshots.values())
+        else:
+            # Take screenshots with a warm browser from the pool
             try:
-                driver = self.setup_browser()
-                comment_ids = [comment['id'] for comment in comments]
-                screenshots = self.take_screenshot(
-                    driver, 
-                    f"https://reddit.com{submission.permalink}", 
-                    submission.id,
-                    comment_ids
-                )
+                with self.browser_pool.driver() as driver:
+                    comment_ids = [comment['id'] for comment in comments]
+                    screenshots = self.take_screenshot(
+                        driver, 
+                        f"{self.reddit_base_url}{post_data['url']}", 
+                        post_data['id'],
+                        comment_ids
+                    )
             except Exception as e:
                 print(f"Error with browser operations: {e}")
                 screenshots = {}
-            finally:
-                if driver:
-                    try:
-                        driver.quit()
-                    except:
-                        pass
-            
-            if not screenshots:
-                print("No screenshots were taken. Cannot create video.")
-                return None
-            
-            # Prepare post data
-            post_data = {
-                'id': submission.id,
-                'title': submission.title,
-                'text': submission.selftext,
-                'url': submission.permalink,
-                'subreddit': getattr(submission, 'subreddit_name', subreddit)
-            }
-            
-            # Create video
-            video_path = self.create_video(post_data, comments, screenshots, audio_files)
-            
-            if not video_path:
-                print("Failed to create video!")
-                return None
-            
-            result = {
-                'video_path': video_path,
-                'post_data': post_data,
-                'comments_data': comments
-            }
-            
-            print(f"✅ Video generation complete: {video_path}")
-            
+        
+        job['screenshots'] = screenshots
+        return job
+    
+    @job_scoped
+    def prepare_assets(self, job):
+        """Generate narration and screenshots for a fetched job"""
+        if not job.get('audio_files'):
+            self.narrate_job(job)
+        if not job.get('screenshots'):
+            self.capture_job(job)
+        
+        audio_files = job['audio_files']
+        screenshots = job['screenshots']
+        job['temp_files'] = list(audio_files.values()) + list(screenshots.values())
+        
+        if not screenshots:
+            print("No screenshots were taken. Cannot create video.")
+            self.cleanup_temp_files(job['temp_files'])
+            return None
+        return job
+    
+    @job_scoped
+    def render_job(self, job):
+        """Render the video for a job with narration and screenshots"""
+        video_path = self.create_video(
+            job['post_data'], job['comments_data'], job['screenshots'], job['audio_files']
+        )
+        
+        if not video_path:
+            print("Failed to create video!")
+            self.cleanup_temp_files(job['temp_files'])
+            return None
+        
+        job['video_path'] = video_path
+        print(f"✅ Video generation complete: {video_path}")
+        return job
+    
+    @job_scoped
+    def finish_job(self, job, auto_upload=False, interactive=True):
+        """Queue (or offer to queue) a rendered job for upload, record it and clean up"""
+        video_path = job['video_path']
+        post_data = job['post_data']
+        comments = job['comments_data']
+        
+        result = {
+            'video_path': video_path,
+            'post_data': post_data,
+            'comments_data': comments
+        }
+        
+        upload = auto_upload
+        if not auto_upload and interactive:
             # Ask user about YouTube upload
             while True:
                 try:
                     upload_choice = input("\nDo you want to upload this video to YouTube? (y/n): ").lower().strip()
                     if upload_choice in ['y', 'yes']:
-                        youtube_result = self.upload_to_youtube(video_path, post_data, comments)
-                        if youtube_result:
-                            result.update(youtube_result)
-                        else:
-                            print("Failed to upload to YouTube, but video was created successfully.")
+                        upload = True
                         break
                     elif upload_choice in ['n', 'no']:
                         print("Video saved locally. Skipping YouTube upload.")
@@ -701,38 +1037,349 @@ Original Post: {post_data['title']}
                 except KeyboardInterrupt:
                     print("\nSkipping YouTube upload.")
                     break
+        elif not auto_upload:
+            print("Video saved locally. Skipping YouTube upload.")
+        
+        # Mark post as processed (before queueing, so the upload's own status update wins)
+        self.processed_posts.add(
+            post_data['id'],
+            subreddit=post_data.get('subreddit'),
+            status='queued' if upload else 'rendered',
+            output_path=video_path
+        )
+        
+        if upload:
+            # Hand the video to the background uploaders; rendering carries on meanwhile
+            result['upload_job'] = self.upload_spool.enqueue(
+                video_path, post_data, comments, thumbnail_path=job['screenshots'].get('post')
+            )
+            self.start_uploads()
+            print("📤 Video queued for upload")
+        
+        # Clean up temporary files
+        self.cleanup_temp_files(job.get('temp_files', []))
+        
+        print(f"✅ Process complete!")
+        return result
+    
+    def save_job(self, job):
+        """
+        Write a job's manifest so a later command (or process) can pick it up.
+        
+        Returns:
+            str: Manifest path
+        """
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        path = os.path.join(self.jobs_dir, f"{job['post_data']['id']}.json")
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+    
+    def load_job(self, path):
+        """Read a job manifest written by save_job"""
+        with open(path, 'r') as f:
+            return json.load(f)
+    
+    def start_uploads(self):
+        """Authenticate once, then start the background upload workers"""
+        try:
+            self.authenticate_youtube()
+        except Exception as e:
+            print(f"YouTube authentication failed: {e}")
+            print("Queued videos stay in the upload spool for the next run")
+            return False
+        self.upload_pool.start()
+        self.upload_pool.notify()
+        return True
+    
+    @job_scoped
+    def upload_spooled(self, job, heartbeat):
+        """Upload one spooled video (runs on an upload worker)"""
+        # A job spooled without a thumbnail gets none: screenshots/ may hold another post's by now
+        return self.upload_to_youtube(
+            job['video_path'], job['post_data'], job['comments_data'],
+            thumbnail_path=job.get('thumbnail_path'), on_progress=heartbeat, guess_thumbnail=False
+        )
+    
+    def record_upload(self, job, result):
+        """Record the outcome of a background upload"""
+        post_data = job['post_data']
+        self.processed_posts.add(
+            post_data['id'],
+            subreddit=post_data.get('subreddit'),
+            status='uploaded' if result else 'upload_failed',
+            output_path=job['video_path']
+        )
+    
+    def wait_for_uploads(self):
+        """Block until every queued upload has finished or been given up on"""
+        if not self.upload_pool.threads:
+            return
+        counts = self.upload_spool.counts()
+        if counts['pending'] or counts['active']:
+            print(f"Waiting for {counts['pending'] + counts['active']} upload(s) to finish...")
+        self.upload_pool.wait()
+    
+    def generate_and_upload_video(self, subreddit=None, auto_upload=None, renderer=None, interactive=True):
+        """Main method to generate and optionally upload video"""
+        print("Starting video generation...")
+        
+        if auto_upload is None:
+            auto_upload = self.auto_upload
+        
+        try:
+            job = self.fetch_job(subreddit)
+            if not job:
+                return None
+            job['renderer'] = renderer or self.renderer
             
-            # Mark post as processed
-            self.processed_posts.add(submission.id)
-            self.save_processed_posts()
+            job = self.prepare_assets(job)
+            if not job:
+                return None
             
-            # Clean up temporary files
-            self.cleanup_temp_files()
+            job = self.render_job(job)
+            if not job:
+                return None
             
-            print(f"✅ Process complete!")
-            return result
+            return self.finish_job(job, auto_upload=auto_upload, interactive=interactive)
             
         except Exception as e:
             print(f"Error in video generation process: {e}")
             return None
+    
+    def run_batch(self, count, subreddit=None, auto_upload=None, renderer=None, queue_size=2, max_attempts=None):
+        """Generate `count` videos with fetch, narration/screenshots and rendering overlapped"""
+        if auto_upload is None:
+            auto_upload = self.auto_upload
+        if max_attempts is None:
+            max_attempts = count * 3
+        
+        print(f"Starting batch of {count} videos...")
+        fetched = 0
+        attempts = 0
+        ready = []
+        
+        def next_job():
+            nonlocal fetched, attempts
+            while fetched < count and (ready or attempts < max_attempts):
+                if not ready:
+                    # Fetch a few posts at once so their Reddit round-trips overlap
+                    wanted = min(count - fetched, queue_size + 1, max_attempts - attempts)
+                    jobs, tried = self.fetch_jobs(wanted, subreddit)
+                    attempts += tried
+                    ready.extend(jobs)
+                    continue
+                job = ready.pop(0)
+                fetched += 1
+                job['renderer'] = renderer or self.renderer
+                return job
+            return None
+        
+        results = []
+        pipeline = StagePipeline(
+            [('assets', self.prepare_assets, self.browser_pool.size), ('render', self.render_job)],
+            queue_size=queue_size
+        )
+        pipeline.run(
+            next_job,
+            on_result=lambda job: results.append(
+                self.finish_job(job, auto_upload=auto_upload, interactive=False)
+            )
+        )
+        
+        print(f"✅ Batch complete: {len(results)}/{count} videos generated")
+        return results
 
-def main():
-    """Main function"""
+COMMANDS = ('run', 'daemon', 'fetch', 'narrate', 'render', 'upload')
+
+
+def build_parser():
+    """Command line: one subcommand per stage, each loading only the libraries it needs"""
     import argparse
-    parser = argparse.ArgumentParser(description="Reddit Story Video Generator")
-    parser.add_argument('--auto-upload', action='store_true', help='Automatically upload to YouTube without prompt')
-    args = parser.parse_args()
+    
+    # Generator options shared by every command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--tts-workers', type=int, default=2, help='Number of TTS worker processes (0 = synthesize in-process)')
+    common.add_argument('--tts-cache-mb', type=int, default=512, help='Size budget of the narration cache in MB (0 = disabled)')
+    common.add_argument('--browsers', type=int, default=1, help='Number of headless browsers kept warm for screenshots')
+    common.add_argument('--renderer', choices=['browser', 'cards'], default='browser', help='Screenshot reddit.com or draw the cards offline')
+    common.add_argument('--render-engine', choices=['ffmpeg', 'segmented', 'moviepy'], default='ffmpeg',
+                        help='Render with one ffmpeg filter graph, one ffmpeg process per card (flat memory), or moviepy')
+    common.add_argument('--render-workers', type=int, default=1, help='Cards rendered at once by the segmented engine')
+    common.add_argument('--background-size', default=None, metavar='WxH',
+                        help="Scale and crop backgrounds to this size, or only fix the height with e.g. 'x1080' (default: keep each source's aspect ratio, at most 1080 high)")
+    common.add_argument('--segment-cache-mb', type=int, default=1024,
+                        help='Size budget of the rendered-segment cache in MB (segmented engine; 0 = disabled)')
+    common.add_argument('--sync-reddit', action='store_true', help='Fetch from Reddit one request at a time, even if asyncpraw is installed')
+    common.add_argument('--reddit-cache', choices=['off', 'cache', 'record', 'replay'], default='cache',
+                        help="Reuse fresh Reddit responses (sync and async fetches alike), record every response, "
+                             "or replay recorded ones offline (record/replay fetch one request at a time)")
+    common.add_argument('--upload-workers', type=int, default=2, help='Number of concurrent background YouTube uploads')
+    common.add_argument('--upload-chunk-mb', type=int, default=8, help='YouTube upload chunk size in MB (rounded to 256 KB)')
+    common.add_argument('--no-metrics', action='store_true', help='Do not write per-stage timings to metrics/')
+    
+    parser = argparse.ArgumentParser(
+        description="Reddit Story Video Generator",
+        epilog="Without a command, 'run' is assumed (e.g. main.py --count 5 --auto-upload)."
+    )
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    
+    run = commands.add_parser('run', parents=[common], help='Fetch, narrate, render and upload videos (default)')
+    run.add_argument('--auto-upload', action='store_true', help='Automatically upload to YouTube without prompt')
+    run.add_argument('--count', type=int, default=1, help='Number of videos to generate in one pipelined batch')
+    run.add_argument('--subreddit', default=None, help='Subreddit to pull posts from (default: random story subreddit)')
+    run.add_argument('--prepare-backgrounds', action='store_true', help='Transcode every background video to the render profile and exit')
+    
+    daemon = commands.add_parser('daemon', parents=[common], help='Keep running with warm clients, making videos on a schedule and on request')
+    daemon.add_argument('--auto-upload', action='store_true', help='Queue every video for upload')
+    daemon.add_argument('--subreddit', default=None, help='Subreddit for scheduled videos (default: random story subreddit)')
+    daemon.add_argument('--rate', type=float, default=1.0, help='Scheduled videos per hour (0 = only make requested videos)')
+    daemon.add_argument('--port', type=int, default=8765, help='Localhost port of the control interface')
+    
+    fetch = commands.add_parser('fetch', parents=[common], help='Fetch posts and comments into job manifests')
+    fetch.add_argument('--count', type=int, default=1, help='Number of posts to fetch')
+    fetch.add_argument('--subreddit', default=None, help='Subreddit to pull posts from (default: random story subreddit)')
+    
+    narrate = commands.add_parser('narrate', parents=[common], help='Generate the narration of job manifests')
+    narrate.add_argument('manifests', nargs='+', help='Job manifests written by fetch')
+    
+    render = commands.add_parser('render', parents=[common], help='Capture the cards and render the videos of job manifests')
+    render.add_argument('manifests', nargs='+', help='Job manifests written by fetch or narrate')
+    
+    upload = commands.add_parser('upload', parents=[common], help='Queue rendered job manifests and drain the upload spool')
+    upload.add_argument('manifests', nargs='*', help='Rendered job manifests (default: only drain the spool)')
+    
+    return parser
+
+
+def run_command(generator, args):
+    if args.prepare_backgrounds:
+        prepared = generator.background_library.prepare_all()
+        print(f"✅ {len(prepared)} background(s) ready in {generator.background_cache_dir}/")
+        return
+    if args.count > 1:
+        results = generator.run_batch(args.count, subreddit=args.subreddit, auto_upload=args.auto_upload)
+        for result in results:
+            print(f"Video saved at: {result['video_path']}")
+        generator.wait_for_uploads()
+        return
+    result = generator.generate_and_upload_video(subreddit=args.subreddit, auto_upload=args.auto_upload)
+    if result:
+        print(f"\nSuccess! Video saved at: {result['video_path']}")
+        generator.wait_for_uploads()
+    else:
+        print("Failed to generate video")
+
+
+def daemon_command(generator, args):
+    daemon = VideoDaemon(
+        generator, interval=3600 / args.rate if args.rate > 0 else None, subreddit=args.subreddit,
+        auto_upload=args.auto_upload, port=args.port
+    )
+    daemon.serve_forever()
+
+
+def fetch_command(generator, args):
+    jobs = []
+    attempts = 0
+    while len(jobs) < args.count and attempts < args.count * 3:
+        fetched, tried = generator.fetch_jobs(args.count - len(jobs), args.subreddit)
+        attempts += tried
+        jobs.extend(fetched)
+    
+    for job in jobs:
+        path = generator.save_job(job)
+        # Keep other workers from fetching the same post
+        generator.processed_posts.add(
+            job['post_data']['id'], subreddit=job['post_data'].get('subreddit'), status='fetched', output_path=path
+        )
+        print(f"Job saved at: {path}")
+
+
+def narrate_command(generator, args):
+    for path in args.manifests:
+        job = generator.narrate_job(generator.load_job(path))
+        generator.save_job(job)
+        print(f"✅ Narrated {path}")
+
+
+def render_command(generator, args):
+    for path in args.manifests:
+        job = generator.load_job(path)
+        job.setdefault('renderer', args.renderer)
+        job = generator.prepare_assets(job)
+        if job:
+            job = generator.render_job(job)
+        if not job:
+            print(f"Failed to render {path}")
+            continue
+        generator.save_job(job)
+        post_data = job['post_data']
+        generator.processed_posts.add(
+            post_data['id'], subreddit=post_data.get('subreddit'), status='rendered', output_path=job['video_path']
+        )
+
+
+def upload_command(generator, args):
+    for path in args.manifests:
+        job = generator.load_job(path)
+        if not job.get('video_path'):
+            print(f"{path} has not been rendered yet, skipping")
+            continue
+        generator.finish_job(job, auto_upload=True, interactive=False)
+    if not args.manifests:
+        # Only drain what earlier runs left in the spool
+        generator.start_uploads()
+    generator.wait_for_uploads()
+
+
+def parse_size(text):
+    """'1920x1080' -> (1920, 1080), 'x1080' -> (None, 1080), None -> None"""
+    if not text:
+        return None
+    width, _, height = text.lower().partition('x')
     try:
-        generator = RedditVideoGenerator(auto_upload=args.auto_upload)
-        result = generator.generate_and_upload_video(auto_upload=args.auto_upload)
-        if result:
-            print(f"\nSuccess! Video saved at: {result['video_path']}")
-            if 'video_url' in result:
-                print(f"YouTube URL: {result['video_url']}")
-        else:
-            print("Failed to generate video")
+        return int(width) if width else None, int(height) if height else None
+    except ValueError:
+        raise ValueError(f"Invalid size '{text}', expected WxH, e.g. 1920x1080 or x1080")
+
+
+COMMAND_HANDLERS = {
+    'run': run_command,
+    'daemon': daemon_command,
+    'fetch': fetch_command,
+    'narrate': narrate_command,
+    'render': render_command,
+    'upload': upload_command,
+}
+
+
+def main(argv=None):
+    """Main function"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # 'run' is the default command, so `main.py --count 5` keeps working
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['run'] + argv
+    args = build_parser().parse_args(argv)
+    
+    generator = None
+    try:
+        generator = RedditVideoGenerator(
+            auto_upload=getattr(args, 'auto_upload', False), tts_workers=args.tts_workers, tts_cache_mb=args.tts_cache_mb,
+            browsers=args.browsers, renderer=args.renderer, render_engine=args.render_engine,
+            async_reddit=not args.sync_reddit, verify_auth=getattr(args, 'count', 1) <= 1, reddit_cache=args.reddit_cache,
+            upload_chunk_mb=args.upload_chunk_mb, upload_workers=args.upload_workers, metrics=not args.no_metrics,
+            render_workers=args.render_workers, segment_cache_mb=args.segment_cache_mb,
+            background_size=parse_size(args.background_size)
+        )
+        COMMAND_HANDLERS[args.command](generator, args)
     except Exception as e:
         print(f"Fatal error: {e}")
+    finally:
+        if generator:
+            generator.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,346 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+_current_span = contextvars.ContextVar('metrics_span', default=None)
+_current_job = contextvars.ContextVar('metrics_job', default=None)
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def _current_rss():
+    """Resident set size of this process in bytes, or None where /proc is not available"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _paths(result):
+    """File paths in a stage's return value (a path, or a dict of them)"""
+    if isinstance(result, str):
+        return [result]
+    if isinstance(result, dict):
+        return [value for value in result.values() if isinstance(value, str)]
+    return []
+
+
+class Span:
+    """Measurements of one stage run; collected by Instrumentation.span"""
+
+    def __init__(self, stage, job):
+        self.stage = stage
+        self.job = job
+        self.bytes_written = 0
+        self.retries = 0
+        self.child_cpu_seconds = 0.0
+        self.child_peak_rss = None
+        self.peak_rss = None
+        self.ok = True
+        self.error = None
+        # Segment renders and upload workers report from several threads
+        self.lock = threading.Lock()
+
+    def add_bytes(self, count):
+        with self.lock:
+            self.bytes_written += count
+
+    def add_files(self, paths):
+        for path in paths:
+            try:
+                self.add_bytes(os.path.getsize(path))
+            except (OSError, TypeError):
+                pass
+
+    def add_child(self, cpu_seconds, peak_rss=None):
+        with self.lock:
+            self.child_cpu_seconds += cpu_seconds
+            if peak_rss is not None:
+                self.child_peak_rss = max(self.child_peak_rss or 0, peak_rss)
+
+    def observe_rss(self, rss):
+        if rss is not None:
+            with self.lock:
+                self.peak_rss = max(self.peak_rss or 0, rss)
+
+    def retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def fail(self, error=None):
+        self.ok = False
+        self.error = error
+
+
+def current_span():
+    """The span the calling code runs in, or None"""
+    return _current_span.get()
+
+
+def count_retry():
+    """Count a retry against the current span (no-op outside one)"""
+    span = _current_span.get()
+    if span:
+        span.retry()
+
+
+def count_bytes(count):
+    """Count bytes written or sent against the current span (no-op outside one)"""
+    span = _current_span.get()
+    if span:
+        span.add_bytes(count)
+
+
+def count_child(cpu_seconds, peak_rss=None):
+    """Charge CPU time (and peak RSS) of work done in another process to the current span"""
+    span = _current_span.get()
+    if span:
+        span.add_child(cpu_seconds, peak_rss)
+
+
+def run_process(command):
+    """
+    subprocess.run() with text output captured, charging the child's CPU
+    time and peak RSS to the current span.
+
+    The child is reaped with os.wait4, which returns the rusage of that one
+    process, so concurrent spans never pick up each other's children.
+    """
+    if not hasattr(os, 'wait4'):
+        return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace")
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output = {}
+
+    def drain(name, stream):
+        output[name] = stream.read()
+        stream.close()
+
+    readers = [
+        threading.Thread(target=drain, args=(name, stream), daemon=True)
+        for name, stream in (('stdout', process.stdout), ('stderr', process.stderr))
+    ]
+    for reader in readers:
+        reader.start()
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    for reader in readers:
+        reader.join()
+
+    count_child(usage.ru_utime + usage.ru_stime, usage.ru_maxrss * _RSS_UNIT)
+    return subprocess.CompletedProcess(
+        command, process.returncode,
+        output['stdout'].decode('utf-8', errors='replace'), output['stderr'].decode('utf-8', errors='replace')
+    )
+
+
+class Instrumentation:
+    """
+    Per-stage timing and resource accounting.
+
+    Every span records wall time, CPU time of the calling thread, CPU time
+    and peak RSS of the child processes it ran (ffmpeg via run_process, TTS
+    workers via count_child), the process RSS sampled while it was open,
+    bytes written and retries. Finished spans are appended to a JSON-lines
+    file, tagged with the job (post id) they belong to, and summed per stage
+    into a Prometheus text-format file that node_exporter's textfile
+    collector can scrape.
+
+    RSS is a property of the whole process, so spans that overlap (pipelined
+    batches, parallel segment renders) each see the others' memory as well.
+    """
+
+    PREFIX = 'reddit_video'
+
+    def __init__(self, directory, enabled=True, sample_interval=0.05):
+        """
+        Args:
+            directory (str): Where spans.jsonl and reddit_video.prom are written
+            enabled (bool): Record nothing when False
+            sample_interval (float): Seconds between RSS samples while spans are open
+        """
+        self.directory = directory
+        self.enabled = enabled
+        self.sample_interval = sample_interval
+        self.spans_path = os.path.join(directory, 'spans.jsonl')
+        self.prometheus_path = os.path.join(directory, f'{self.PREFIX}.prom')
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.process_peak_rss = 0
+        self.active = set()
+        self.sampler = None
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def job(job_id):
+        """Attribute every span inside the block to `job_id`"""
+        token = _current_job.set(job_id)
+        try:
+            yield
+        finally:
+            _current_job.reset(token)
+
+    def sample(self):
+        """Sampler thread: feed the process RSS to every open span"""
+        while True:
+            time.sleep(self.sample_interval)
+            rss = _current_rss()
+            with self.lock:
+                spans = list(self.active)
+            for span in spans:
+                span.observe_rss(rss)
+
+    def open(self, span):
+        span.observe_rss(_current_rss())
+        with self.lock:
+            self.active.add(span)
+            if self.sampler is None and _current_rss() is not None:
+                self.sampler = threading.Thread(target=self.sample, name='metrics-rss', daemon=True)
+                self.sampler.start()
+
+    def close(self, span):
+        with self.lock:
+            self.active.discard(span)
+        span.observe_rss(_current_rss())
+
+    @contextlib.contextmanager
+    def span(self, stage, job=None):
+        """Measure the block as one run of `stage`"""
+        span = Span(stage, job or _current_job.get())
+        token = _current_span.set(span)
+        if self.enabled:
+            self.open(span)
+        started_at = time.time()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_span.reset(token)
+            wall_seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.thread_time() - cpu_start
+            if self.enabled:
+                self.close(span)
+            self.record(span, {
+                'job': span.job,
+                'stage': stage,
+                'started_at': started_at,
+                'wall_seconds': wall_seconds,
+                'cpu_seconds': cpu_seconds,
+                'child_cpu_seconds': span.child_cpu_seconds,
+                'rss_peak_bytes': span.peak_rss,
+                'child_rss_peak_bytes': span.child_peak_rss,
+                'bytes_written': span.bytes_written,
+                'retries': span.retries,
+                'ok': span.ok,
+                'error': span.error,
+            })
+
+    def record(self, span, row):
+        if not self.enabled:
+            return
+        with self.lock:
+            with open(self.spans_path, 'a') as f:
+                f.write(json.dumps(row) + '\n')
+
+            totals = self.totals.setdefault(span.stage, {
+                'ok': 0, 'failed': 0, 'wall_seconds': 0.0, 'wall_seconds_max': 0.0, 'cpu_seconds': 0.0,
+                'rss_peak_bytes': None, 'child_rss_peak_bytes': None, 'bytes_written': 0, 'retries': 0,
+            })
+            totals['ok' if span.ok else 'failed'] += 1
+            totals['wall_seconds'] += row['wall_seconds']
+            totals['wall_seconds_max'] = max(totals['wall_seconds_max'], row['wall_seconds'])
+            totals['cpu_seconds'] += row['cpu_seconds'] + row['child_cpu_seconds']
+            for key in ('rss_peak_bytes', 'child_rss_peak_bytes'):
+                if row[key] is not None:
+                    totals[key] = max(totals[key] or 0, row[key])
+            totals['bytes_written'] += row['bytes_written']
+            totals['retries'] += row['retries']
+            self.process_peak_rss = max(self.process_peak_rss, row['rss_peak_bytes'] or 0)
+            self.write_prometheus()
+
+    def write_prometheus(self):
+        p = self.PREFIX
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{p}_{name}{{{label_text}}} {value}" if label_text else f"{p}_{name} {value}")
+
+        stages = sorted(self.totals.items())
+        metric('stage_runs_total', 'counter', 'Finished stage runs',
+               [({'stage': stage, 'outcome': outcome}, t[outcome]) for stage, t in stages for outcome in ('ok', 'failed')])
+        metric('stage_wall_seconds_total', 'counter', 'Wall time spent in each stage',
+               [({'stage': stage}, round(t['wall_seconds'], 6)) for stage, t in stages])
+        metric('stage_wall_seconds_max', 'gauge', 'Slowest single run of each stage',
+               [({'stage': stage}, round(t['wall_seconds_max'], 6)) for stage, t in stages])
+        metric('stage_cpu_seconds_total', 'counter',
+               'CPU time of each stage: the calling thread plus the ffmpeg processes and TTS work it ran',
+               [({'stage': stage}, round(t['cpu_seconds'], 6)) for stage, t in stages])
+        metric('stage_rss_peak_bytes_max', 'gauge',
+               'Highest process RSS sampled while a run of each stage was open (overlapping stages share it)',
+               [({'stage': stage}, t['rss_peak_bytes']) for stage, t in stages if t['rss_peak_bytes'] is not None])
+        metric('stage_child_rss_peak_bytes_max', 'gauge', 'Largest peak RSS of a child process run by each stage',
+               [({'stage': stage}, t['child_rss_peak_bytes']) for stage, t in stages
+                if t['child_rss_peak_bytes'] is not None])
+        metric('stage_bytes_written_total', 'counter', 'Bytes written or uploaded by each stage',
+               [({'stage': stage}, t['bytes_written']) for stage, t in stages])
+        metric('stage_retries_total', 'counter', 'Retries inside each stage',
+               [({'stage': stage}, t['retries']) for stage, t in stages])
+        metric('process_rss_peak_bytes', 'gauge', 'Highest RSS of the generator process sampled during any stage',
+               [({}, self.process_peak_rss)])
+
+        tmp_path = f"{self.prometheus_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.prometheus_path)
+
+
+def instrumented(stage):
+    """
+    Run a generator method inside a span of `self.metrics`.
+
+    Files named in the return value (a path or a dict of paths) count as
+    bytes written, and a None return marks the span as failed.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.span(stage) as span:
+                result = method(self, *args, **kwargs)
+                span.add_files(_paths(result))
+                if result is None:
+                    span.fail()
+                return result
+        return wrapper
+    return decorate
+
+
+def job_scoped(method):
+    """Attribute the spans of a method taking a job dict to that job's post id"""
+    @functools.wraps(method)
+    def wrapper(self, job, *args, **kwargs):
+        with Instrumentation.job(job['post_data']['id']):
+            return method(self, job, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,111 @@
+import queue
+import threading
+
+
+class StagePipeline:
+    """Run jobs through a chain of stages, each stage on its own thread.
+
+    Stages are connected by bounded queues so a fast stage can only run a
+    few jobs ahead of a slow one (e.g. the next post is fetched and narrated
+    while the current one is rendering). A stage that returns None drops the
+    job; a stage that raises drops the job and the error is printed.
+    """
+
+    _DONE = object()
+
+    def __init__(self, stages, queue_size=2):
+        """
+        Args:
+            stages (list): (name, callable) or (name, callable, workers) tuples; each callable
+                takes a job and returns a job or None
+            queue_size (int): Maximum number of jobs waiting between two stages
+        """
+        self.stages = [stage if len(stage) == 3 else (*stage, 1) for stage in stages]
+        self.queue_size = queue_size
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def _run_stage(self, name, func, inbox, outbox, remaining):
+        while True:
+            job = inbox.get()
+            if job is self._DONE:
+                with self.lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                # The last worker of a stage passes the end marker on; the others hand it to a sibling
+                if last:
+                    outbox.put(self._DONE)
+                else:
+                    inbox.put(self._DONE)
+                return
+            if self.stop_event.is_set():
+                continue
+            try:
+                result = func(job)
+            except Exception as e:
+                print(f"Error in {name} stage: {e}")
+                result = None
+            if result is not None:
+                outbox.put(result)
+
+    def run(self, source, on_result=None):
+        """
+        Feed jobs from `source` through every stage.
+
+        Args:
+            source (callable): Called with no arguments, returns the next job or None when exhausted
+            on_result (callable): Called on the caller's thread with each job leaving the last stage
+
+        Returns:
+            list: Jobs that made it through every stage
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = []
+        for (name, func, workers), inbox, outbox in zip(self.stages, queues, queues[1:]):
+            remaining = [workers]
+            for i in range(workers):
+                thread = threading.Thread(
+                    target=self._run_stage, args=(name, func, inbox, outbox, remaining),
+                    name=f"pipeline-{name}-{i}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        def feed():
+            try:
+                while not self.stop_event.is_set():
+                    job = source()
+                    if job is None:
+                        break
+                    queues[0].put(job)
+            except Exception as e:
+                print(f"Error producing jobs: {e}")
+            finally:
+                queues[0].put(self._DONE)
+
+        feeder = threading.Thread(target=feed, name="pipeline-source", daemon=True)
+        feeder.start()
+
+        results = []
+        try:
+            while True:
+                job = queues[-1].get()
+                if job is self._DONE:
+                    break
+                results.append(job)
+                if on_result:
+                    on_result(job)
+        except KeyboardInterrupt:
+            print("\nStopping pipeline...")
+            self.stop_event.set()
+            raise
+        finally:
+            feeder.join(timeout=1)
+            for thread in threads:
+                thread.join(timeout=1)
+
+        return results
+
+    def stop(self):
+        """Stop accepting new jobs; jobs already in flight are discarded"""
+        self.stop_event.set()
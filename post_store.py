@@ -0,0 +1,112 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ProcessedPostStore:
+    """
+    History of processed Reddit posts, kept in SQLite.
+
+    Each post is one indexed row (post id, subreddit, timestamp, status,
+    output path), so recording a post is a single insert and a lookup is a
+    primary-key probe. Nothing is rewritten as the history grows. WAL mode
+    lets overlapping runs read and write the same file safely.
+
+    Behaves like the set it replaces: `post_id in store` and `store.add(post_id)`.
+    """
+
+    def __init__(self, db_path, legacy_json_path=None):
+        """
+        Args:
+            db_path (str): SQLite database file
+            legacy_json_path (str): Old processed_posts.json to import once (optional)
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS processed_posts (
+                    post_id TEXT PRIMARY KEY,
+                    subreddit TEXT,
+                    processed_at REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    output_path TEXT
+                )
+            """)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        if legacy_json_path:
+            self.import_json(legacy_json_path)
+
+    def import_json(self, json_path):
+        """Import post ids from an old processed_posts.json (only once per database)"""
+        with self.lock:
+            imported = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'legacy_json_imported'"
+            ).fetchone()
+        if imported or not os.path.exists(json_path):
+            return
+
+        try:
+            with open(json_path, 'r') as f:
+                content = f.read().strip()
+            post_ids = json.loads(content) if content else []
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error importing {json_path}: {e}")
+            post_ids = []
+
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO processed_posts (post_id, processed_at, status) VALUES (?, ?, 'imported')",
+                [(post_id, now) for post_id in post_ids]
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_json_imported', ?)", (json_path,)
+            )
+        if post_ids:
+            print(f"Imported {len(post_ids)} processed posts from {json_path}")
+
+    def __contains__(self, post_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM processed_posts WHERE post_id = ?", (post_id,)
+            ).fetchone() is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM processed_posts").fetchone()[0]
+
+    def add(self, post_id, subreddit=None, status='done', output_path=None):
+        """Record (or update) a processed post"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO processed_posts (post_id, subreddit, processed_at, status, output_path) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (post_id, subreddit, time.time(), status, output_path)
+            )
+
+    def get(self, post_id):
+        """
+        Look up a post.
+
+        Returns:
+            dict: The stored record, or None if the post was never processed
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT post_id, subreddit, processed_at, status, output_path FROM processed_posts WHERE post_id = ?",
+                (post_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('post_id', 'subreddit', 'processed_at', 'status', 'output_path'), row))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,194 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import time
+
+from prawcore import Requestor
+
+from metrics import count_retry
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Request priorities, most urgent first
+HIGH = 0    # comments of a post we already committed to
+NORMAL = 1  # listings and posts we need right now
+LOW = 2     # speculative prefetch
+
+_priority = contextvars.ContextVar('reddit_request_priority', default=NORMAL)
+
+
+class RateLimiter:
+    """
+    Token bucket for Reddit API requests, shared by every process on the host.
+
+    The bucket lives in a small JSON state file guarded by an exclusive lock
+    file, so concurrent generator processes draw from the same budget
+    instead of each sleeping on their own. Reddit's X-Ratelimit headers
+    slow the refill rate down to whatever is left of the server's window,
+    so throughput tapers off before the limit is hit rather than stalling
+    on 429s. Lower-priority requests leave a reserve of tokens untouched
+    for more urgent ones.
+    """
+
+    def __init__(self, state_path, rate=100 / 60, burst=10, low_priority_reserve=0.5):
+        """
+        Args:
+            state_path (str): JSON file holding the shared bucket (a `.lock` file sits next to it)
+            rate (float): Requests per second when Reddit reports no tighter limit
+            burst (int): Bucket capacity
+            low_priority_reserve (float): Fraction of the bucket LOW priority requests may not use
+        """
+        self.state_path = state_path
+        self.lock_path = f"{state_path}.lock"
+        self.rate = rate
+        self.burst = burst
+        # Tokens that must stay in the bucket after a request of each priority
+        self.reserve = {HIGH: 0, NORMAL: 1, LOW: max(1, burst * low_priority_reserve)}
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(self.lock_path, 'a+') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                # LK_LOCK gives up after ~10 s; keep trying
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass
+            try:
+                state = self._load()
+                yield state
+                self._save(state)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {'tokens': self.burst, 'updated': time.time()}
+
+    def _save(self, state):
+        with open(self.state_path, 'w') as f:
+            json.dump(state, f)
+
+    def _refill(self, state, now):
+        rate = self.rate
+        if now < state.get('window_reset_at', 0):
+            rate = min(rate, state['window_rate'])
+        elapsed = max(0.0, now - state.get('updated', now))
+        state['tokens'] = min(self.burst, state.get('tokens', self.burst) + elapsed * rate)
+        state['updated'] = now
+        return rate
+
+    def _reserve(self, priority):
+        """Take a token if one is free; returns 0, or the seconds to wait before trying again"""
+        with self._locked() as state:
+            now = time.time()
+            rate = self._refill(state, now)
+            blocked_until = state.get('blocked_until', 0)
+            if now < blocked_until:
+                return blocked_until - now
+            floor = self.reserve.get(priority, self.reserve[NORMAL])
+            if state['tokens'] >= floor + 1:
+                state['tokens'] -= 1
+                return 0
+            return (floor + 1 - state['tokens']) / max(rate, 1e-3)
+
+    def acquire(self, priority=None):
+        """Block until a request of `priority` (default: the current context's) may be sent"""
+        priority = _priority.get() if priority is None else priority
+        while True:
+            wait = self._reserve(priority)
+            if not wait:
+                return
+            # Re-check at least every second: another process may change the picture
+            time.sleep(min(wait, 1.0))
+
+    async def acquire_async(self, priority=None):
+        """Same as acquire(), but waits without blocking the event loop"""
+        priority = _priority.get() if priority is None else priority
+        while True:
+            wait = self._reserve(priority)
+            if not wait:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def record(self, headers):
+        """Adjust the refill rate to Reddit's X-Ratelimit-Remaining/Reset headers"""
+        try:
+            remaining = float(headers['x-ratelimit-remaining'])
+            reset = float(headers['x-ratelimit-reset'])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._locked() as state:
+            now = time.time()
+            self._refill(state, now)
+            # Spread what is left of the window evenly over the time until it resets
+            state['window_reset_at'] = now + reset
+            state['window_rate'] = remaining / max(reset, 1.0)
+            state['tokens'] = min(state['tokens'], remaining)
+            if remaining < 1:
+                state['blocked_until'] = now + reset
+
+    def penalize(self, retry_after):
+        """Stop every process from sending requests for `retry_after` seconds (after a 429)"""
+        with self._locked() as state:
+            now = time.time()
+            self._refill(state, now)
+            state['tokens'] = 0
+            state['blocked_until'] = max(state.get('blocked_until', 0), now + retry_after)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def priority(level):
+        """Send every Reddit request made inside the block with priority `level`"""
+        token = _priority.set(level)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+
+def retry_after(headers, default=10.0):
+    try:
+        return float(headers.get('retry-after', default))
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimitedRequestor(Requestor):
+    """prawcore requestor that waits on a RateLimiter before every request and retries 429s"""
+
+    def __init__(self, *args, rate_limiter=None, max_retries=3, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+
+    def request(self, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            response = super().request(*args, **kwargs)
+            self.rate_limiter.record(response.headers)
+            if response.status_code != 429 or attempt >= self.max_retries:
+                return response
+            attempt += 1
+            delay = retry_after(response.headers)
+            print(f"Reddit rate limit hit, retrying in {delay:.0f}s ({attempt}/{self.max_retries})")
+            count_retry()
+            self.rate_limiter.penalize(delay)
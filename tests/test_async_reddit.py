@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('asyncprawcore')
+from aiohttp import web
+from asyncprawcore import ReadOnlyAuthorizer, Session, TrustedAuthenticator
+
+from async_reddit import async_rate_limited_requestor
+from rate_limit import RateLimiter
+
+
+async def serve_reddit(hot_statuses):
+    """A local stand-in for reddit.com and oauth.reddit.com; /r/test/hot answers with `hot_statuses` in turn"""
+    calls = []
+
+    async def access_token(request):
+        return web.json_response({'access_token': 'token', 'expires_in': 3600, 'scope': '*', 'token_type': 'bearer'})
+
+    async def hot(request):
+        calls.append(request.path)
+        status = hot_statuses[min(len(calls), len(hot_statuses)) - 1]
+        headers = {'x-ratelimit-remaining': '99', 'x-ratelimit-used': '1', 'x-ratelimit-reset': '60', 'retry-after': '0'}
+        if status == 429:
+            return web.Response(status=429, headers=headers)
+        return web.json_response({'kind': 'Listing', 'data': {'children': []}}, headers=headers)
+
+    app = web.Application()
+    app.router.add_post('/api/v1/access_token', access_token)
+    app.router.add_get('/r/test/hot', hot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", calls
+
+
+def fetch_hot(tmp_path, hot_statuses):
+    async def run():
+        runner, url, calls = await serve_reddit(hot_statuses)
+        requestor = async_rate_limited_requestor()(
+            user_agent='test-suite/1.0', oauth_url=url, reddit_url=url,
+            rate_limiter=RateLimiter(str(tmp_path / 'rate.json'))
+        )
+        try:
+            authenticator = TrustedAuthenticator(client_id='id', client_secret='secret', requestor=requestor)
+            authorizer = ReadOnlyAuthorizer(authenticator=authenticator)
+            await authorizer.refresh()
+            response = await Session(authorizer=authorizer).request(method='GET', path='/r/test/hot')
+        finally:
+            await requestor.close()
+            await runner.cleanup()
+        return response, calls
+
+    return asyncio.run(run())
+
+
+def test_requests_go_through_asyncprawcore(tmp_path):
+    response, calls = fetch_hot(tmp_path, [200])
+    assert response['kind'] == 'Listing'
+    assert calls == ['/r/test/hot']
+
+
+def test_rate_limited_request_is_retried(tmp_path):
+    response, calls = fetch_hot(tmp_path, [429, 200])
+    assert response['kind'] == 'Listing'
+    assert len(calls) == 2
+
+
+def test_cache_mode_serves_repeated_gets_from_disk(tmp_path):
+    from http_cache import ResponseCache
+    from async_reddit import async_caching_requestor
+
+    async def run():
+        runner, url, calls = await serve_reddit([200])
+        cache = ResponseCache(str(tmp_path / 'cache'), mode='cache')
+        requestor = async_caching_requestor()(
+            user_agent='test-suite/1.0', oauth_url=url, reddit_url=url,
+            rate_limiter=RateLimiter(str(tmp_path / 'rate.json')), response_cache=cache
+        )
+        try:
+            authenticator = TrustedAuthenticator(client_id='id', client_secret='secret', requestor=requestor)
+            authorizer = ReadOnlyAuthorizer(authenticator=authenticator)
+            await authorizer.refresh()
+            session = Session(authorizer=authorizer)
+            responses = [await session.request(method='GET', path='/r/test/hot') for _ in range(2)]
+        finally:
+            await requestor.close()
+            await runner.cleanup()
+        return responses, calls
+
+    responses, calls = asyncio.run(run())
+    assert [response['kind'] for response in responses] == ['Listing', 'Listing']
+    assert calls == ['/r/test/hot']
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from comment_selector import CommentSelector
+
+
+class MoreComments:
+    """Stand-in for praw's MoreComments stub; the selector recognises stubs by class name"""
+
+    def __init__(self, parent_id, children):
+        self.parent_id = parent_id
+        self.children = children
+        self.expanded = 0
+
+    def comments(self):
+        self.expanded += 1
+        return self.children
+
+
+def comment(comment_id, score, parent_id='t3_post'):
+    return SimpleNamespace(id=comment_id, body='a comment long enough to narrate', score=score,
+                           author='someone', parent_id=parent_id)
+
+
+def test_reply_level_stub_in_morechildren_page_is_not_expanded():
+    nested = MoreComments('t1_b', [comment('c', 1, parent_id='t1_b')])
+    top = MoreComments('t3_post', [comment('b', 5), comment('r', 4, parent_id='t1_b'), nested])
+    submission = SimpleNamespace(id='post', comment_sort='top', comments=[comment('a', 10), top])
+
+    selected = CommentSelector(max_comments=3).select(submission)
+
+    assert [c['id'] for c in selected] == ['a', 'b']
+    assert top.expanded == 1
+    assert nested.expanded == 0
@@ -0,0 +1,273 @@
+import multiprocessing
+import os
+import random
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+from file_cache import FileCache, hash_key, link_or_copy
+from metrics import count_child
+
+# Per-process state, set up once by _init_worker
+_engine = None
+_voice_ids = []
+_init_error = None
+
+
+def _resolve_voices(engine):
+    """Return the ids of the voices to narrate with, preferring female/en voices"""
+    voices = engine.getProperty('voices')
+    # Prefer female/en voices, else randomize
+    preferred_voices = [v for v in voices if ('en' in v.languages[0] if hasattr(v, 'languages') and v.languages else 'en' in v.id) and ('female' in v.name.lower() or 'zira' in v.id.lower() or 'susan' in v.id.lower())]
+    if not preferred_voices:
+        preferred_voices = [v for v in voices if 'en' in (v.languages[0] if hasattr(v, 'languages') and v.languages else v.id)]
+    if not preferred_voices:
+        preferred_voices = voices
+    return [v.id for v in preferred_voices]
+
+
+def _init_worker(rate, volume):
+    """
+    Start a TTS engine and resolve its voices once for the life of the process.
+
+    Failures are recorded instead of raised: a Pool initializer that raises
+    makes the pool respawn the worker forever.
+    """
+    global _engine, _voice_ids, _init_error
+    try:
+        # Imported here so only processes that actually narrate load the speech stack
+        import pyttsx3
+        _engine = pyttsx3.init()
+        _engine.setProperty('rate', rate)
+        _engine.setProperty('volume', volume)
+        _voice_ids = _resolve_voices(_engine)
+    except Exception as e:
+        _engine = None
+        _init_error = f"{type(e).__name__}: {e}"
+
+
+def _get_voice_ids():
+    """(voice ids, engine start-up error or None) of this process"""
+    return list(_voice_ids), _init_error
+
+
+def normalize_text(text):
+    """Normalize text so trivially different strings share a cache entry"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def _synthesize(text, filepath, voice_id=None):
+    """Write `text` to `filepath` with the warm engine; returns (filepath or None, error)"""
+    if _engine is None:
+        return None, _init_error or "TTS engine not started"
+    # `filepath` may still be a hard link to a cache entry (a cache hit left behind by an
+    # earlier run); writing through it would overwrite that entry, so write beside it and swap
+    tmp_path = f"{os.path.splitext(filepath)[0]}.tmp{os.getpid()}.wav"
+    try:
+        if voice_id is None and _voice_ids:
+            voice_id = random.choice(_voice_ids)
+        if voice_id:
+            _engine.setProperty('voice', voice_id)
+        _engine.save_to_file(text, tmp_path)
+        _engine.runAndWait()
+
+        # Verify file was created
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, filepath)
+            return filepath, None
+        return None, "Audio file not created"
+    except Exception as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return None, str(e)
+
+
+def _synthesize_measured(text, filepath, voice_id=None):
+    """_synthesize in a pool worker, adding the CPU seconds it took and the worker's peak RSS"""
+    cpu_start = time.process_time()
+    path, error = _synthesize(text, filepath, voice_id)
+    cpu_seconds = time.process_time() - cpu_start
+    try:
+        import resource
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    except ImportError:
+        peak_rss = None
+    return path, error, cpu_seconds, peak_rss
+
+
+class NarrationService:
+    """
+    Text-to-speech backed by a pool of long-lived worker processes.
+
+    Each worker keeps its pyttsx3 engine and resolved voice list for its whole
+    life, so clips only pay for synthesis. With workers=0 the engine lives in
+    the calling process instead.
+
+    When a cache is configured, finished clips are stored under a hash of
+    the normalized text, voice, rate and volume, and a repeated clip is
+    copied out of the cache instead of being synthesized again.
+    """
+
+    def __init__(self, workers=2, rate=165, volume=1.0, cache_dir=None, cache_max_bytes=512 * 1024 * 1024,
+                 start_timeout=60, clip_timeout=300):
+        """
+        Args:
+            workers (int): Number of worker processes (0 = synthesize in-process)
+            rate (int): Speech rate in words per minute
+            volume (float): Volume between 0.0 and 1.0
+            cache_dir (str): Directory for the audio cache (None disables caching)
+            cache_max_bytes (int): Byte budget for the audio cache
+            start_timeout (int): Seconds to wait for a worker's engine to start
+            clip_timeout (int): Seconds to wait for one clip before giving up on it
+        """
+        self.workers = workers
+        self.rate = rate
+        self.volume = volume
+        self.pool = None
+        self.local_ready = False
+        self.voice_ids = None
+        # Why the engine could not start; narration is skipped (clips come back as None) while set
+        self.error = None
+        self.start_timeout = start_timeout
+        self.clip_timeout = clip_timeout
+        self.cache = FileCache(cache_dir, cache_max_bytes, suffix='.wav') if cache_dir else None
+        # Several asset workers narrate at once; only one of them may start (or stop) the pool
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the workers (done automatically on first use).
+
+        Returns:
+            bool: True if the TTS engine is available
+        """
+        with self.lock:
+            if self.error:
+                return False
+            if self.workers > 0:
+                if self.pool is None:
+                    # Spawned, not forked: by now this process runs pipeline, metrics and reader
+                    # threads, and a fork can copy one of their locks in its held state
+                    self.pool = multiprocessing.get_context('spawn').Pool(
+                        self.workers, initializer=_init_worker, initargs=(self.rate, self.volume)
+                    )
+            elif not self.local_ready:
+                _init_worker(self.rate, self.volume)
+                self.local_ready = True
+
+            if self.voice_ids is None:
+                try:
+                    if self.pool is not None:
+                        voice_ids, error = self.pool.apply_async(_get_voice_ids).get(timeout=self.start_timeout)
+                    else:
+                        voice_ids, error = _get_voice_ids()
+                except multiprocessing.TimeoutError:
+                    voice_ids, error = None, f"engine did not start within {self.start_timeout}s"
+                if error:
+                    self.error = error
+                    print(f"TTS unavailable: {error}")
+                    self._stop_pool(self.pool)
+                    return False
+                self.voice_ids = voice_ids
+            return True
+
+    def choose_voice(self, text):
+        """Pick a voice for `text`; the same text always gets the same voice so it can be cached"""
+        if not self.voice_ids:
+            return None
+        return random.Random(normalize_text(text)).choice(self.voice_ids)
+
+    def cache_key(self, text, voice_id):
+        return hash_key(normalize_text(text), voice_id, self.rate, self.volume)
+
+    def synthesize(self, text, filepath):
+        """
+        Synthesize one clip.
+
+        Returns:
+            str: Path to the WAV file or None if failed
+        """
+        return self.synthesize_many({filepath: (text, filepath)})[filepath]
+
+    def synthesize_many(self, clips):
+        """
+        Synthesize several clips in parallel.
+
+        Args:
+            clips (dict): key -> (text, filepath)
+
+        Returns:
+            dict: key -> path to the WAV file, or None for clips that failed
+        """
+        if not self.start():
+            return {key: None for key in clips}
+
+        results = {}
+        misses = {}
+        for key, (text, filepath) in clips.items():
+            voice_id = self.choose_voice(text)
+            cache_key = self.cache_key(text, voice_id)
+            cached = self.cache.get(cache_key) if self.cache else None
+            if cached:
+                link_or_copy(cached, filepath)
+                print(f"TTS cache hit: {os.path.basename(filepath)}")
+                results[key] = filepath
+            else:
+                misses[key] = (text, filepath, voice_id, cache_key)
+
+        pool = self.pool
+        if pool is not None:
+            pending = {
+                key: pool.apply_async(_synthesize_measured, (text, filepath, voice_id))
+                for key, (text, filepath, voice_id, _) in misses.items()
+            }
+            outcomes = {}
+            timed_out = False
+            for key, result in pending.items():
+                try:
+                    path, error, cpu_seconds, peak_rss = result.get(timeout=0 if timed_out else self.clip_timeout)
+                    # The work ran in another process, so the caller's span cannot see it otherwise
+                    count_child(cpu_seconds, peak_rss)
+                    outcomes[key] = (path, error)
+                except multiprocessing.TimeoutError:
+                    outcomes[key] = (None, f"timed out after {self.clip_timeout}s")
+                    timed_out = True
+            if timed_out:
+                # A stuck engine would hold its worker forever; start fresh ones next time
+                with self.lock:
+                    self._stop_pool(pool)
+        else:
+            outcomes = {
+                key: _synthesize(text, filepath, voice_id)
+                for key, (text, filepath, voice_id, _) in misses.items()
+            }
+
+        for key, (path, error) in outcomes.items():
+            if error:
+                print(f"Error generating TTS for {os.path.basename(clips[key][1])}: {error}")
+            elif self.cache:
+                try:
+                    self.cache.put(misses[key][3], path)
+                except OSError as e:
+                    print(f"Error caching TTS for {os.path.basename(path)}: {e}")
+            results[key] = path
+        return results
+
+    def _stop_pool(self, pool):
+        """Terminate `pool` unless another thread already replaced it (call with self.lock held)"""
+        if pool is not None and pool is self.pool:
+            pool.terminate()
+            pool.join()
+            self.pool = None
+
+    def close(self):
+        """Shut down the worker processes"""
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
@@ -0,0 +1,277 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+from file_cache import link_or_copy
+
+
+class UploadSpool:
+    """
+    Directory-backed queue of finished videos waiting to be uploaded.
+
+    Each job is one JSON file (video path, post/comment metadata, thumbnail)
+    that moves between `pending/`, `active/`, `done/` and `failed/`.
+    Claiming a job is an atomic rename, so any number of worker threads or
+    processes can drain the same spool, and jobs left behind by a crash are
+    picked up again by the next run.
+    """
+
+    STATES = ('pending', 'active', 'done', 'failed', 'thumbnails')
+
+    def __init__(self, directory, stale_after=900):
+        """
+        Args:
+            directory (str): Spool root directory
+            stale_after (int): Seconds without a heartbeat before an active job is handed out again
+        """
+        self.directory = directory
+        self.stale_after = stale_after
+        for state in self.STATES:
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+
+    def _path(self, state, name):
+        return os.path.join(self.directory, state, name)
+
+    def _write(self, path, job):
+        tmp_path = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _jobs(self, state):
+        return sorted(
+            name for name in os.listdir(os.path.join(self.directory, state))
+            if name.endswith('.json')
+        )
+
+    def enqueue(self, video_path, post_data, comments_data, thumbnail_path=None):
+        """
+        Add a finished video to the spool.
+
+        The thumbnail is copied in, since the screenshots it comes from are
+        cleaned up long before a queued upload runs.
+
+        Returns:
+            str: Job id
+        """
+        job_id = f"{time.time():.6f}_{post_data['id']}_{uuid.uuid4().hex[:8]}"
+        spooled_thumbnail = None
+        if thumbnail_path and os.path.exists(thumbnail_path):
+            spooled_thumbnail = self._path('thumbnails', f"{job_id}{os.path.splitext(thumbnail_path)[1]}")
+            link_or_copy(thumbnail_path, spooled_thumbnail)
+
+        job = {
+            'id': job_id,
+            'video_path': os.path.abspath(video_path),
+            'post_data': post_data,
+            'comments_data': comments_data,
+            'thumbnail_path': spooled_thumbnail,
+            'enqueued_at': time.time(),
+            'attempts': 0,
+            'not_before': 0,
+            'last_error': None,
+        }
+        self._write(self._path('pending', f"{job_id}.json"), job)
+        return job_id
+
+    def requeue_stale(self):
+        """Return active jobs whose worker stopped sending heartbeats to pending"""
+        now = time.time()
+        for name in self._jobs('active'):
+            path = self._path('active', name)
+            try:
+                if now - os.path.getmtime(path) > self.stale_after:
+                    os.rename(path, self._path('pending', name))
+            except OSError:
+                pass
+
+    def claim(self):
+        """
+        Take the oldest pending job that is due.
+
+        Returns:
+            dict: The job, or None when nothing is due
+        """
+        self.requeue_stale()
+        now = time.time()
+        for name in self._jobs('pending'):
+            path = self._path('pending', name)
+            try:
+                with open(path, 'r') as f:
+                    job = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if job.get('not_before', 0) > now:
+                continue
+            try:
+                os.rename(path, self._path('active', name))
+            except OSError:
+                # Another worker got there first
+                continue
+            self.heartbeat(job)
+            return job
+        return None
+
+    def heartbeat(self, job):
+        """Mark an active job as still being worked on"""
+        try:
+            os.utime(self._path('active', f"{job['id']}.json"))
+        except OSError:
+            pass
+
+    def complete(self, job, result):
+        """Move an active job to done/ with its upload result"""
+        job['result'] = result
+        job['finished_at'] = time.time()
+        self._finish(job, 'done')
+
+    def retry(self, job, error, delay):
+        """Put an active job back in pending/, due again after `delay` seconds"""
+        job['attempts'] += 1
+        job['last_error'] = error
+        job['not_before'] = time.time() + delay
+        self._write(self._path('pending', f"{job['id']}.json"), job)
+        self._remove('active', job)
+
+    def fail(self, job, error):
+        """Give up on an active job"""
+        job['attempts'] += 1
+        job['last_error'] = error
+        job['finished_at'] = time.time()
+        self._finish(job, 'failed')
+
+    def _finish(self, job, state):
+        self._write(self._path(state, f"{job['id']}.json"), job)
+        self._remove('active', job)
+        if job.get('thumbnail_path'):
+            try:
+                os.remove(job['thumbnail_path'])
+            except OSError:
+                pass
+
+    def _remove(self, state, job):
+        try:
+            os.remove(self._path(state, f"{job['id']}.json"))
+        except OSError:
+            pass
+
+    def counts(self):
+        """Number of jobs in each state"""
+        return {state: len(self._jobs(state)) for state in self.STATES if state != 'thumbnails'}
+
+
+class UploadWorkerPool:
+    """
+    Worker threads that drain an UploadSpool in the background.
+
+    Each worker claims a job, runs `upload(job, heartbeat)` and records the
+    outcome. Failed uploads go back to the spool with exponential backoff
+    until `max_attempts` is reached, so a slow or flaky network never holds
+    up rendering.
+    """
+
+    def __init__(self, spool, upload, workers=2, max_attempts=5, retry_delay=30, poll_interval=5, on_done=None):
+        """
+        Args:
+            spool (UploadSpool): Spool to drain
+            upload (callable): upload(job, heartbeat) -> result dict, or None on failure
+            workers (int): Concurrent uploads
+            max_attempts (int): Uploads tried per job before it is moved to failed/
+            retry_delay (int): Seconds before the first retry (doubled after each failure)
+            poll_interval (int): Seconds between spool scans when idle
+            on_done (callable): on_done(job, result) once a job is uploaded (result) or given up on (None)
+        """
+        self.spool = spool
+        self.upload = upload
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.on_done = on_done
+        self.threads = []
+        self.busy = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.stopping = threading.Event()
+
+    def start(self):
+        """Start the workers (no-op if they are already running)"""
+        with self.lock:
+            if self.threads:
+                return
+            self.stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"uploader-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def notify(self):
+        """Wake idle workers after a job was enqueued"""
+        with self.wakeup:
+            self.wakeup.notify_all()
+
+    def _work(self):
+        while not self.stopping.is_set():
+            job = self.spool.claim()
+            if job is None:
+                with self.wakeup:
+                    self.wakeup.wait(self.poll_interval)
+                continue
+
+            with self.lock:
+                self.busy += 1
+            try:
+                try:
+                    result = self.upload(job, lambda *_: self.spool.heartbeat(job))
+                    error = None if result else "upload failed"
+                except Exception as e:
+                    result, error = None, str(e)
+
+                if result:
+                    self.spool.complete(job, result)
+                elif job['attempts'] + 1 < self.max_attempts:
+                    delay = self.retry_delay * 2 ** job['attempts']
+                    print(f"Upload of {job['post_data']['id']} failed ({error}); retrying in {delay}s")
+                    self.spool.retry(job, error, delay)
+                    continue
+                else:
+                    print(f"❌ Giving up on uploading {job['post_data']['id']} after {self.max_attempts} attempts")
+                    self.spool.fail(job, error)
+
+                if self.on_done:
+                    try:
+                        self.on_done(job, result)
+                    except Exception as e:
+                        print(f"Error recording upload of {job['post_data']['id']}: {e}")
+            finally:
+                with self.wakeup:
+                    self.busy -= 1
+                    self.wakeup.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Block until the spool has no pending or active jobs.
+
+        Returns:
+            bool: True if the spool drained, False on timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            counts = self.spool.counts()
+            with self.lock:
+                idle = self.busy == 0
+            if idle and counts['pending'] == 0 and counts['active'] == 0:
+                return True
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(1)
+
+    def close(self, timeout=None):
+        """Stop the workers after their current upload (an unfinished one resumes on the next run)"""
+        self.stopping.set()
+        self.notify()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
@@ -0,0 +1,152 @@
+import json
+import os
+import time
+
+from file_cache import hash_key
+from metrics import count_bytes, count_retry
+
+# YouTube requires chunks in multiples of 256 KiB
+CHUNK_ALIGNMENT = 256 * 1024
+
+RETRIABLE_STATUS_CODES = (500, 502, 503, 504)
+# The upload session is gone; only a fresh upload can succeed
+EXPIRED_SESSION_CODES = (404, 410)
+
+
+class ResumableUploader:
+    """
+    Chunked YouTube video upload that resumes across process restarts.
+
+    The resumable session URI and the last committed byte offset are saved
+    to a small JSON file per video after every chunk. When a new process
+    uploads the same file, it reattaches to that session, asks YouTube how
+    much it already has, and continues from there instead of starting over.
+    """
+
+    def __init__(self, state_dir, chunk_size=8 * 1024 * 1024, max_retries=8):
+        """
+        Args:
+            state_dir (str): Directory holding the saved upload sessions
+            chunk_size (int): Bytes sent per request (rounded up to 256 KiB)
+            max_retries (int): Consecutive failures tolerated before giving up
+        """
+        self.state_dir = state_dir
+        self.chunk_size = max(1, -(-chunk_size // CHUNK_ALIGNMENT)) * CHUNK_ALIGNMENT
+        self.max_retries = max_retries
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    def state_path(self, video_path):
+        stat = os.stat(video_path)
+        key = hash_key(os.path.abspath(video_path), stat.st_size, stat.st_mtime)
+        return os.path.join(self.state_dir, f"{key}.json")
+
+    def load_state(self, video_path):
+        try:
+            with open(self.state_path(video_path), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def save_state(self, video_path, request):
+        state = {
+            'video_path': os.path.abspath(video_path),
+            'resumable_uri': request.resumable_uri,
+            'offset': request.resumable_progress,
+            'updated_at': time.time(),
+        }
+        path = self.state_path(video_path)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def clear_state(self, video_path):
+        try:
+            os.remove(self.state_path(video_path))
+        except OSError:
+            pass
+
+    def _insert_request(self, youtube, video_path, body):
+        from googleapiclient.http import MediaFileUpload
+        media = MediaFileUpload(video_path, chunksize=self.chunk_size, resumable=True, mimetype='video/*')
+        return youtube.videos().insert(part=','.join(body.keys()), body=body, media_body=media)
+
+    @staticmethod
+    def _resync(request):
+        # Makes the next next_chunk() ask YouTube for the committed offset before sending data
+        request._in_error_state = True
+
+    def upload(self, youtube, video_path, body, on_progress=None):
+        """
+        Upload a video, resuming a saved session for the same file when there is one.
+
+        Args:
+            youtube: Authenticated YouTube API service
+            video_path (str): Video file to upload
+            body (dict): videos.insert body (snippet, status)
+            on_progress (callable): Called with (bytes sent, total bytes) after every chunk (optional)
+
+        Returns:
+            dict: videos.insert response, or None if the upload failed
+        """
+        # googleapiclient is only loaded by processes that upload
+        import httplib2
+        from googleapiclient.errors import HttpError
+        retriable_exceptions = (OSError, httplib2.HttpLib2Error)
+
+        total = os.path.getsize(video_path)
+        request = self._insert_request(youtube, video_path, body)
+
+        state = self.load_state(video_path)
+        if state and state.get('resumable_uri'):
+            print(f"Resuming upload at {state['offset'] / 1024 / 1024:.1f} MB")
+            request.resumable_uri = state['resumable_uri']
+            request.resumable_progress = state['offset']
+            self._resync(request)
+
+        response = None
+        failures = 0
+        sent = request.resumable_progress
+        while response is None:
+            try:
+                status, response = request.next_chunk()
+            except HttpError as e:
+                if e.resp.status in EXPIRED_SESSION_CODES and request.resumable_uri:
+                    print("Saved upload session expired, starting over")
+                    self.clear_state(video_path)
+                    request = self._insert_request(youtube, video_path, body)
+                    sent = 0
+                    continue
+                if e.resp.status not in RETRIABLE_STATUS_CODES:
+                    print(f"HTTP Error: {e}")
+                    return None
+                error = f"Server error: {e}"
+            except retriable_exceptions as e:
+                error = f"Network error: {e}"
+            else:
+                failures = 0
+                if status:
+                    self.save_state(video_path, request)
+                    count_bytes(max(0, status.resumable_progress - sent))
+                    sent = status.resumable_progress
+                    print(f"Upload progress: {int(status.progress() * 100)}% "
+                          f"({sent / 1024 / 1024:.1f}/{total / 1024 / 1024:.1f} MB)")
+                    if on_progress:
+                        on_progress(sent, total)
+                continue
+
+            failures += 1
+            count_retry()
+            if failures > self.max_retries:
+                print(f"Upload failed after {self.max_retries} retries: {error}")
+                return None
+            if request.resumable_uri:
+                self.save_state(video_path, request)
+                self._resync(request)
+            delay = min(2 ** failures, 60)
+            print(f"{error}; retrying in {delay}s ({failures}/{self.max_retries})")
+            time.sleep(delay)
+
+        count_bytes(max(0, total - sent))
+        self.clear_state(video_path)
+        return response